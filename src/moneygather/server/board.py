@@ -1,48 +1,201 @@
 """
 Module: board
 """
-from moneygather.server.boxes import Box
-from moneygather.server.boxes import PaymentBox
-from moneygather.server.boxes import TownBox
-from moneygather.server.config import BOARD_BOXES
+from moneygather.server.boxes import BOX_TYPES
+from moneygather.server.exceptions import InvalidBoard
+from moneygather.server.schema import validate
 
+import hashlib
+import json
+import os
 
-class Board:
-    """ A class to represent a board.
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+DEFAULT_BOARD_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'boards',
+    'default.json',
+)
+
+
+class BoardDefinition:
+    """ A class to represent a board layout. It is parsed and validated
+    once and shared by the boards of every game, so its boxes must not be
+    modified.
+
+    Attributes
+    ----------
+    boxes : tuple<Box>
+        Boxes indexed by position
+    layout : dict<str, dict>
+        Json dict of every box by position, sent to the clients once. The
+        positions are str so every codec sends the same keys as JSON
+    version : str
+        Hash of the layout, clients already knowing it skip the layout
     """
 
-    def __init__(self, board_boxes=BOARD_BOXES):
+    def __init__(self, board_boxes):
         self.boxes = self.construct_board(board_boxes)
+        self.layout = {
+            str(position): box.to_json()
+            for position, box in enumerate(self.boxes)
+        }
+        layout = json.dumps(self.layout, sort_keys=True).encode('utf-8')
+        self.version = hashlib.sha1(layout).hexdigest()[:12]
+
+    def __len__(self):
+        return len(self.boxes)
 
     def construct_board(self, board_boxes):
-        """ Creates a list dict all the boxes the board have.
+        """ Creates the boxes of the layout, sorted by position. The
+        positions must go from 0 to the number of boxes minus one.
         """
-
-        boxes = dict()
-
+        if not board_boxes:
+            raise InvalidBoard('The board has no boxes')
+        boxes = [None] * len(board_boxes)
         for box in board_boxes:
             position = box.get('position')
+            if type(position) is not int or not 0 <= position < len(boxes):
+                raise InvalidBoard(f'Invalid box position {position}')
+            if boxes[position] is not None:
+                raise InvalidBoard(f'Duplicated box position {position}')
             boxes[position] = self.construct_box(box)
-
-        return boxes
+        return tuple(boxes)
 
     def construct_box(self, box):
-        box_type = box.pop('type')
+        """ Creates a box of the layout, validated against the fields of
+        its type.
+        """
+        box = dict(box)
+        box_type = box.pop('type', None)
+        box_class = BOX_TYPES.get(box_type)
+        if box_class is None:
+            raise InvalidBoard(
+                f'Unknown type {box_type} of box {box["position"]}',
+            )
+        error = validate(box_class.fields, box)
+        if error is not None:
+            raise InvalidBoard(
+                f'Invalid box {box["position"]}: {error[0]} {error[1]}',
+            )
+        try:
+            return box_class(**box)
+        except TypeError as exception:
+            raise InvalidBoard(
+                f'Invalid box {box["position"]}: {exception}',
+            ) from exception
+
+
+# Board definitions by version, so equal layouts share one definition
+definitions = dict()
+# Board definitions by absolute path of their layout file
+loaded = dict()
 
-        if box_type == 'PaymentBox':
-            return PaymentBox(**box)
 
-        if box_type == 'TownBox':
-            return TownBox(**box)
+def read_layout(path):
+    """ Returns the boxes of a JSON or TOML layout file, a list of tables
+    in its `boxes` key. A JSON file can also be the list itself.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        with open(path, 'rb') as layout_file:
+            if extension == '.json':
+                layout = json.load(layout_file)
+            elif extension == '.toml':
+                if tomllib is None:
+                    raise InvalidBoard('TOML boards require tomli')
+                layout = tomllib.load(layout_file)
+            else:
+                raise InvalidBoard(f'Unknown board format {extension}')
+    except (OSError, ValueError) as exception:
+        raise InvalidBoard(
+            f'Could not read board {path}: {exception}',
+        ) from exception
+
+    if isinstance(layout, dict):
+        layout = layout.get('boxes')
+    if (not isinstance(layout, list)
+            or not all(isinstance(box, dict) for box in layout)):
+        raise InvalidBoard(f'Board {path} has no list of boxes')
+    return layout
 
-        if box_type == 'Box':
-            return Box(**box)
+
+def intern_board(definition):
+    """ Returns the definition already loaded with the same layout, or
+    this one, so the games of every variant share one compiled board.
+    """
+    return definitions.setdefault(definition.version, definition)
+
+
+def load_board(path=None):
+    """ Returns the definition of a layout file, the default board without
+    path. Each file is read and validated once.
+    """
+    path = os.path.abspath(path or DEFAULT_BOARD_FILE)
+    definition = loaded.get(path)
+    if definition is None:
+        definition = intern_board(BoardDefinition(read_layout(path)))
+        loaded[path] = definition
+    return definition
+
+
+DEFAULT_BOARD = load_board()
+
+
+class Board:
+    """ A class to represent the board of a game. The boxes are shared with
+    the other games through the definition, the state of the game is kept
+    in arrays indexed by position.
+
+    Attributes
+    ----------
+    definition : BoardDefinition
+        Layout of the board
+    boxes : tuple<Box>
+        Boxes indexed by position, shared with the definition
+    owners : list<str>
+        UID of the owner of every box, None if not owned. The list is only
+        allocated when a box gets its first owner
+    """
+
+    __slots__ = ('definition', 'boxes', 'owners')
+
+    def __init__(self, definition=DEFAULT_BOARD):
+        self.definition = definition
+        self.boxes = definition.boxes
+        self.owners = None
+
+    def __len__(self):
+        return len(self.boxes)
 
     def get_box(self, index):
-        return self.boxes.get(index)
+        return self.boxes[index]
+
+    def get_owner(self, position):
+        if self.owners is None:
+            return None
+        return self.owners[position]
 
-    def to_json(self):
-        board = dict()
-        for position, box in self.boxes.items():
-            board[position] = box.to_json()
-        return board
+    def set_owner(self, position, owner):
+        if self.owners is None:
+            self.owners = [None] * len(self.boxes)
+        self.owners[position] = owner
+
+    def owned(self):
+        """ Returns the owner of the owned boxes by position, as str, the
+        part of the board sent along with the layout version.
+        """
+        if self.owners is None:
+            return dict()
+        return {
+            str(position): owner
+            for position, owner in enumerate(self.owners)
+            if owner is not None
+        }
@@ -1,13 +1,41 @@
 """
 Module: boxes
 """
-from moneygather.server.log import logger
+from moneygather.server.log import get_logger
+from moneygather.server.schema import Field
 
 
+logger = get_logger('boxes')
+
+# Box classes by the type name used in the board layouts, see `box_type`
+BOX_TYPES = dict()
+
+
+def box_type(box_class):
+    """ Registers the decorated class as a box type of the board layouts,
+    under its class name.
+    """
+    BOX_TYPES[box_class.__name__] = box_class
+    return box_class
+
+
+@box_type
 class Box:
     """ Generic class to represent a box.
+
+    Attributes
+    ----------
+    fields : dict<str, Field>
+        Schema of the box in the board layouts, validated on load
     """
 
+    __slots__ = ('name', 'position')
+
+    fields = {
+        'name': Field(str),
+        'position': Field(int, minimum=0),
+    }
+
     def __init__(self, name, position):
         self.name = name
         self.position = position
@@ -20,8 +48,9 @@ class Box:
         """ Implements what happens when you go in this box.
         """
         logger.debug(
-            'BOX ==> Player UID:'
-            f'{player.UID} goes in: {self.position}'
+            'BOX ==> Player UID: %s goes in: %s',
+            player.UID,
+            self.position,
         )
 
     def to_json(self):
@@ -34,10 +63,15 @@ class Box:
         return box
 
 
+@box_type
 class PaymentBox(Box):
     """ Payment Box
     """
 
+    __slots__ = ('payment',)
+
+    fields = dict(Box.fields, payment=Field(int, minimum=0))
+
     def __init__(self, payment, **kwargs):
         super().__init__(**kwargs)
         self.payment = payment
@@ -45,7 +79,7 @@ class PaymentBox(Box):
     def goes_throught(self, player):
         """ Gets paid
         """
-        player.add_money(1000)
+        player.add_money(self.payment)
 
     def to_json(self):
         box = super().to_json()
@@ -57,10 +91,13 @@ class BuyableBox(Box):
     """ Buyable Box
     """
 
+    __slots__ = ('price',)
+
+    fields = dict(Box.fields, price=Field(int, minimum=0))
+
     def __init__(self, price, **kwargs):
         super().__init__(**kwargs)
         self.price = price
-        self.owner = None
 
     def buy(self, player):
         raise NotImplementedError
@@ -68,10 +105,12 @@ class BuyableBox(Box):
     def to_json(self):
         box = super().to_json()
         box['price'] = self.price
-        box['owner'] = self.owner
         return box
 
 
+@box_type
 class TownBox(BuyableBox):
     """ Town Box
     """
+
+    __slots__ = ()
@@ -0,0 +1,110 @@
+"""
+Module: clock
+"""
+import asyncio
+import heapq
+import itertools
+
+
+class Clock:
+    """ Clock driven by the asyncio loop. Game durations are multiplied by
+    `time_scale`, so a scale lower than 1 accelerates the games.
+
+    Attributes
+    ----------
+    time_scale : float
+        Real seconds per game second
+    """
+
+    def __init__(self, time_scale=1.0):
+        self.time_scale = time_scale
+
+    def time(self):
+        """ Returns the current time in real seconds.
+        """
+        return asyncio.get_running_loop().time()
+
+    def call_at(self, when, callback, *args):
+        """ Runs the callback at `when`. Returns a handle with `cancel`.
+        """
+        return asyncio.get_running_loop().call_at(when, callback, *args)
+
+
+class VirtualHandle:
+    """ Handle of a callback scheduled in a VirtualClock.
+    """
+
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+
+    def cancel(self):
+        self.callback = None
+        self.args = None
+
+    def cancelled(self):
+        return self.callback is None
+
+
+class VirtualClock(Clock):
+    """ Deterministic clock whose time only moves when advanced, used to
+    simulate games without waiting: running it jumps straight to the next
+    callback.
+
+    Attributes
+    ----------
+    now : float
+        Current virtual time
+    callbacks : list<tuple>
+        Heap of (when, sequence, VirtualHandle)
+    """
+
+    def __init__(self, start=0.0):
+        super().__init__(time_scale=1.0)
+        self.now = start
+        self.callbacks = []
+        self.counter = itertools.count()
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback, *args):
+        handle = VirtualHandle(callback, args)
+        heapq.heappush(self.callbacks, (when, next(self.counter), handle))
+        return handle
+
+    def run_next(self):
+        """ Jumps to the next callback and runs it. Returns False if there
+        are no callbacks left.
+        """
+        while self.callbacks:
+            when, _, handle = heapq.heappop(self.callbacks)
+            if handle.cancelled():
+                continue
+            self.now = max(self.now, when)
+            callback, args = handle.callback, handle.args
+            handle.cancel()
+            callback(*args)
+            return True
+        return False
+
+    def advance(self, seconds):
+        """ Runs the callbacks due in the next `seconds` and moves the time.
+        """
+        target = self.now + seconds
+        while self.callbacks and self.callbacks[0][0] <= target:
+            self.run_next()
+        self.now = target
+
+    def run(self, until=None, limit=None):
+        """ Runs callbacks until there are none left, `until()` returns
+        True or `limit` callbacks were run. Returns the number run.
+        """
+        count = 0
+        while limit is None or count < limit:
+            if until is not None and until():
+                break
+            if not self.run_next():
+                break
+            count += 1
+        return count
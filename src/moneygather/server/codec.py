@@ -0,0 +1,159 @@
+"""
+Module: codec
+"""
+from moneygather.server.metrics import encode_seconds
+from moneygather.server.outbox import coalesce_key
+
+import json
+import time
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class Codec:
+    """ Generic class to represent a wire format.
+
+    Attributes
+    ----------
+    name : str
+        Name of the format, used in error messages
+    subprotocol : str
+        Websocket subprotocol negotiated by the clients using the format
+    binary : bool
+        True if the messages are sent as binary frames
+    """
+
+    name = None
+    subprotocol = None
+    binary = False
+
+    def encode(self, message):
+        """ Returns the message encoded as bytes.
+        """
+        raise NotImplementedError
+
+    def decode(self, payload):
+        """ Returns the message decoded from bytes. Raises ValueError if
+        the payload is malformed.
+        """
+        raise NotImplementedError
+
+
+class JSONCodec(Codec):
+    """ JSON text frames, the default format.
+    """
+
+    name = 'JSON'
+    subprotocol = 'moneygather.json'
+
+    def encode(self, message):
+        return json.dumps(message).encode('utf-8')
+
+    def decode(self, payload):
+        return json.loads(payload.decode('utf8'))
+
+
+class MsgPackCodec(Codec):
+    """ MessagePack binary frames.
+    """
+
+    name = 'MessagePack'
+    subprotocol = 'moneygather.msgpack'
+    binary = True
+
+    def encode(self, message):
+        return msgpack.packb(message)
+
+    def decode(self, payload):
+        try:
+            return msgpack.unpackb(payload)
+        except Exception as exception:
+            raise ValueError(str(exception)) from exception
+
+
+class CBORCodec(Codec):
+    """ CBOR binary frames.
+    """
+
+    name = 'CBOR'
+    subprotocol = 'moneygather.cbor'
+    binary = True
+
+    def encode(self, message):
+        return cbor2.dumps(message)
+
+    def decode(self, payload):
+        try:
+            return cbor2.loads(payload)
+        except Exception as exception:
+            raise ValueError(str(exception)) from exception
+
+
+DEFAULT_CODEC = JSONCodec()
+
+CODECS = {
+    DEFAULT_CODEC.subprotocol: DEFAULT_CODEC,
+}
+if msgpack is not None:
+    CODECS[MsgPackCodec.subprotocol] = MsgPackCodec()
+if cbor2 is not None:
+    CODECS[CBORCodec.subprotocol] = CBORCodec()
+
+
+def negotiate_codec(subprotocols):
+    """ Returns the first codec supported from the list of subprotocols
+    offered by a client or None.
+    """
+    for subprotocol in subprotocols:
+        codec = CODECS.get(subprotocol)
+        if codec is not None:
+            return codec
+    return None
+
+
+class EncodedMessage:
+    """ A message encoded and prepared once per codec, on demand, so a
+    broadcast costs one serialization per codec in use.
+
+    Attributes
+    ----------
+    factory : Factory
+        Factory reference, used to prepare the frames
+    message : dict
+        Message to send
+    prepared : dict<str, PreparedMessage>
+        Prepared frames by codec subprotocol
+    key : tuple
+        Key of the messages superseded by this one, None if not any
+    """
+
+    def __init__(self, factory, message):
+        self.factory = factory
+        self.message = message
+        self.prepared = dict()
+        self.key = coalesce_key(message)
+
+    def get(self, codec):
+        """ Returns the frame prepared for the codec.
+        """
+        prepared = self.prepared.get(codec.subprotocol)
+        if prepared is None:
+            started = time.perf_counter()
+            payload = codec.encode(self.message)
+            prepared = self.factory.prepareMessage(
+                payload,
+                isBinary=codec.binary,
+            )
+            self.prepared[codec.subprotocol] = prepared
+            encode_seconds.labels(codec.name).observe(
+                time.perf_counter() - started,
+            )
+        return prepared
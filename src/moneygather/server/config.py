@@ -1,244 +1,101 @@
 """
 Module: config
 """
+import os
 
 
-BOARD_BOXES = [
-    {
-        'position': 0,
-        'type': 'PaymentBox',
-        'name': 'Start',
-        'payment': 1000,
-    },
-    {
-        'position': 1,
-        'type': 'TownBox',
-        'name': 'Town 1',
-        'price': 200,
-    },
-    {
-        'position': 2,
-        'type': 'TownBox',
-        'name': 'Town 2',
-        'price': 200,
-    },
-    {
-        'position': 3,
-        'type': 'TownBox',
-        'name': 'Town 3',
-        'price': 200,
-    },
-    {
-        'position': 4,
-        'type': 'TownBox',
-        'name': 'Town 4',
-        'price': 200,
-    },
-    {
-        'position': 5,
-        'type': 'TownBox',
-        'name': 'Town 5',
-        'price': 200,
-    },
-    {
-        'position': 6,
-        'type': 'TownBox',
-        'name': 'Town 6',
-        'price': 200,
-    },
-    {
-        'position': 7,
-        'type': 'TownBox',
-        'name': 'Town 7',
-        'price': 200,
-    },
-    {
-        'position': 8,
-        'type': 'TownBox',
-        'name': 'Town 8',
-        'price': 200,
-    },
-    {
-        'position': 9,
-        'type': 'TownBox',
-        'name': 'Town 9',
-        'price': 200,
-    },
-    {
-        'position': 10,
-        'type': 'Box',
-        'name': 'Rest 1',
-    },
-    {
-        'position': 11,
-        'type': 'TownBox',
-        'name': 'Town 11',
-        'price': 200,
-    },
-    {
-        'position': 12,
-        'type': 'TownBox',
-        'name': 'Town 12',
-        'price': 200,
-    },
-    {
-        'position': 13,
-        'type': 'TownBox',
-        'name': 'Town 13',
-        'price': 200,
-    },
-    {
-        'position': 14,
-        'type': 'TownBox',
-        'name': 'Town 14',
-        'price': 200,
-    },
-    {
-        'position': 15,
-        'type': 'TownBox',
-        'name': 'Town 15',
-        'price': 200,
-    },
-    {
-        'position': 16,
-        'type': 'TownBox',
-        'name': 'Town 16',
-        'price': 200,
-    },
-    {
-        'position': 17,
-        'type': 'TownBox',
-        'name': 'Town 17',
-        'price': 200,
-    },
-    {
-        'position': 18,
-        'type': 'TownBox',
-        'name': 'Town 18',
-        'price': 200,
-    },
-    {
-        'position': 19,
-        'type': 'TownBox',
-        'name': 'Town 19',
-        'price': 200,
-    },
-    {
-        'position': 20,
-        'type': 'Box',
-        'name': 'Rest 2',
-    },
-    {
-        'position': 21,
-        'type': 'TownBox',
-        'name': 'Town 21',
-        'price': 200,
-    },
-    {
-        'position': 22,
-        'type': 'TownBox',
-        'name': 'Town 22',
-        'price': 200,
-    },
-    {
-        'position': 23,
-        'type': 'TownBox',
-        'name': 'Town 23',
-        'price': 200,
-    },
-    {
-        'position': 24,
-        'type': 'TownBox',
-        'name': 'Town 24',
-        'price': 200,
-    },
-    {
-        'position': 25,
-        'type': 'TownBox',
-        'name': 'Town 25',
-        'price': 200,
-    },
-    {
-        'position': 26,
-        'type': 'TownBox',
-        'name': 'Town 26',
-        'price': 200,
-    },
-    {
-        'position': 27,
-        'type': 'TownBox',
-        'name': 'Town 27',
-        'price': 200,
-    },
-    {
-        'position': 28,
-        'type': 'TownBox',
-        'name': 'Town 28',
-        'price': 200,
-    },
-    {
-        'position': 29,
-        'type': 'TownBox',
-        'name': 'Town 29',
-        'price': 200,
-    },
-    {
-        'position': 30,
-        'type': 'Box',
-        'name': 'Rest 3',
-    },
-    {
-        'position': 31,
-        'type': 'TownBox',
-        'name': 'Town 31',
-        'price': 200,
-    },
-    {
-        'position': 32,
-        'type': 'TownBox',
-        'name': 'Town 32',
-        'price': 200,
-    },
-    {
-        'position': 33,
-        'type': 'TownBox',
-        'name': 'Town 33',
-        'price': 200,
-    },
-    {
-        'position': 34,
-        'type': 'TownBox',
-        'name': 'Town 34',
-        'price': 200,
-    },
-    {
-        'position': 35,
-        'type': 'TownBox',
-        'name': 'Town 35',
-        'price': 200,
-    },
-    {
-        'position': 36,
-        'type': 'TownBox',
-        'name': 'Town 36',
-        'price': 200,
-    },
-    {
-        'position': 37,
-        'type': 'TownBox',
-        'name': 'Town 37',
-        'price': 200,
-    },
-    {
-        'position': 38,
-        'type': 'TownBox',
-        'name': 'Town 38',
-        'price': 200,
-    },
-    {
-        'position': 39,
-        'type': 'TownBox',
-        'name': 'Town 39',
-        'price': 200,
-    },
-]
+def parse_levels(levels):
+    """ Parses a `subsystem=LEVEL,...` string into a dict.
+    """
+    parsed = dict()
+    for item in levels.split(','):
+        subsystem, _, level = item.partition('=')
+        if subsystem.strip() and level.strip():
+            parsed[subsystem.strip()] = level.strip().upper()
+    return parsed
+
+
+def parse_rate(rate):
+    """ Parses a `rate/burst` string into a tuple, None if empty. The burst
+    defaults to the rate.
+    """
+    if not rate.strip():
+        return None
+    rate, _, burst = rate.partition('/')
+    return float(rate), float(burst or rate)
+
+
+def parse_rates(rates):
+    """ Parses a `ACTION=rate/burst,...` string into a dict.
+    """
+    parsed = dict()
+    for item in rates.split(','):
+        action, _, rate = item.partition('=')
+        if action.strip() and rate.strip():
+            parsed[action.strip()] = parse_rate(rate)
+    return parsed
+
+
+# Logging
+LOG_FILE = os.environ.get(
+    'MONEYGATHER_LOG_FILE',
+    '/opt/Moneygather/moneygather.server/logs/server.log',
+)
+LOG_LEVEL = os.environ.get('MONEYGATHER_LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = parse_levels(os.environ.get('MONEYGATHER_LOG_LEVELS', ''))
+
+# Event loop: auto (uvloop when installed), asyncio or uvloop
+EVENT_LOOP = os.environ.get('MONEYGATHER_LOOP', 'auto').lower()
+
+# Server processes sharing the port
+WORKERS = int(os.environ.get('MONEYGATHER_WORKERS', '1'))
+
+# Seconds the running games have to end on shutdown
+DRAIN_TIMEOUT = float(os.environ.get('MONEYGATHER_DRAIN_TIMEOUT', '300'))
+
+# Game checkpoints, disabled without store path
+STORE_PATH = os.environ.get('MONEYGATHER_STORE', '')
+CHECKPOINT_INTERVAL = float(
+    os.environ.get('MONEYGATHER_CHECKPOINT_INTERVAL', '1'),
+)
+RESTORE_GRACE = float(os.environ.get('MONEYGATHER_RESTORE_GRACE', '60'))
+
+# Seconds the seat of a disconnected player is held
+RESUME_GRACE = float(os.environ.get('MONEYGATHER_RESUME_GRACE', '30'))
+
+# Outbound backpressure, per connection
+WRITE_BUFFER_HIGH = int(
+    os.environ.get('MONEYGATHER_WRITE_BUFFER_HIGH', '65536'),
+)
+WRITE_BUFFER_LOW = int(os.environ.get('MONEYGATHER_WRITE_BUFFER_LOW', '16384'))
+OUTBOX_LIMIT = int(os.environ.get('MONEYGATHER_OUTBOX_LIMIT', '256'))
+SLOW_CONSUMER_TIMEOUT = float(
+    os.environ.get('MONEYGATHER_SLOW_CONSUMER_TIMEOUT', '10'),
+)
+
+# Inbound limits, per connection. Messages per second and burst, for all
+# the messages and per action
+MAX_MESSAGE_SIZE = int(os.environ.get('MONEYGATHER_MAX_MESSAGE_SIZE', '4096'))
+RATE_LIMIT = parse_rate(os.environ.get('MONEYGATHER_RATE_LIMIT', '20/40'))
+ACTION_RATE_LIMITS = parse_rates(os.environ.get(
+    'MONEYGATHER_ACTION_RATE_LIMITS',
+    'MESSAGE=1/5,PLAYER_STATUS=2/5,PLAYER_UPDATED=2/5',
+))
+
+# Longest chat line, player name and other player attributes, in characters
+MAX_CHAT_LENGTH = int(os.environ.get('MONEYGATHER_MAX_CHAT_LENGTH', '500'))
+MAX_NAME_LENGTH = int(os.environ.get('MONEYGATHER_MAX_NAME_LENGTH', '32'))
+MAX_ATTRIBUTE_LENGTH = int(
+    os.environ.get('MONEYGATHER_MAX_ATTRIBUTE_LENGTH', '16'),
+)
+
+# Metrics HTTP server, disabled with port 0. Every worker serves its own
+# metrics on METRICS_PORT + worker identifier
+METRICS_HOST = os.environ.get('MONEYGATHER_METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('MONEYGATHER_METRICS_PORT', '9100'))
+
+# Board layout file, JSON or TOML, the default board if empty
+BOARD_FILE = os.environ.get('MONEYGATHER_BOARD', '')
+
+# Game clock, real seconds per game second
+TIME_SCALE = float(os.environ.get('MONEYGATHER_TIME_SCALE', '1'))
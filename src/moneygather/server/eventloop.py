@@ -0,0 +1,32 @@
+"""
+Module: eventloop
+"""
+from moneygather.server.log import get_logger
+
+import asyncio
+
+
+logger = get_logger('eventloop')
+
+
+LOOPS = ('auto', 'asyncio', 'uvloop')
+
+
+def install_loop(name='auto'):
+    """ Sets the event loop policy of the process: `uvloop`, the standard
+    `asyncio` one or `auto`, uvloop when installed. Falls back to asyncio
+    if uvloop is not installed. Returns the name of the loop in use.
+    """
+    if name not in LOOPS:
+        raise ValueError(f'Unknown event loop {name}, expected {LOOPS}')
+    if name != 'asyncio':
+        try:
+            import uvloop
+        except ImportError:
+            if name == 'uvloop':
+                logger.warning('LOOP ==> uvloop not installed, using asyncio')
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            return 'uvloop'
+    asyncio.set_event_loop_policy(None)
+    return 'asyncio'
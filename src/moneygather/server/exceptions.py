@@ -16,3 +16,8 @@ class GameIsFull(Exception):
 class PlayerNoUpdatableAttribute(Exception):
     """ This attribute cannot be updated by this method.
     """
+
+
+class InvalidBoard(Exception):
+    """ The board layout is not valid.
+    """
@@ -2,163 +2,321 @@
 Module: factory
 """
 from autobahn.asyncio.websocket import WebSocketServerFactory
-from moneygather.server.exceptions import GameAlreadyStarted
-from moneygather.server.exceptions import GameIsFull
-from moneygather.server.game import Game
-from moneygather.server.player import Player
-from moneygather.server.utils import number_to_string
+from collections import Counter
+from moneygather.server.codec import EncodedMessage
+from moneygather.server.log import get_logger
+from moneygather.server.matchmaking import Matchmaker
+from moneygather.server.room import Room
+from moneygather.server.store import Checkpointer
 
-import json
+import random
+import uuid
+import zlib
+
+
+logger = get_logger('factory')
 
 
 class Factory(WebSocketServerFactory):
+    """ Websocket factory holding the registry of rooms.
+
+    Attributes
+    ----------
+    rooms : dict<str, Room>
+        Rooms by room identifier
+    open_rooms : dict<str, Room>
+        Rooms accepting new players, in creation order
+    matchmaker : Matchmaker
+        Queue of clients waiting for a room
+    scheduler : Scheduler
+        Scheduler of the games, None to use the default one
+    rng : Random
+        Random generator of the games, None to use the default one
+    worker_id : int
+        Identifier of the worker process running the factory
+    workers : int
+        Number of worker processes
+    worker_port : callable
+        Returns the port of a worker, to redirect clients to it
+    draining : bool
+        True once the server stopped accepting players
+    checkpointer : Checkpointer
+        Writes the running games to the store, None without store
+    resume_grace : float
+        Seconds the seat of a disconnected player is held
+    evictions : int
+        Number of clients dropped for not reading their messages
+    dropped : Counter<str, int>
+        Messages dropped by the rate limits, by action, None for the
+        messages dropped before decoding
+    board : BoardDefinition
+        Board of the games, the default board if None
+    board_messages : dict<str, EncodedMessage>
+        BOARD message of every board definition in use, by version
+    """
 
-    def __init__(self):
+    DRAIN_CODE = 3003
+    SHUTDOWN_CODE = 3004
+
+    def __init__(
+        self,
+        num_players=2,
+        scheduler=None,
+        seed=None,
+        worker_id=0,
+        workers=1,
+        worker_port=None,
+        store=None,
+        checkpoint_interval=1.0,
+        resume_grace=30.0,
+        board=None,
+    ):
         super().__init__()
-        self.clients = []
-        self.game = Game(self)
+        self.num_players = num_players
+        self.worker_id = worker_id
+        self.workers = workers
+        self.worker_port = worker_port
+        self.scheduler = scheduler
+        self.rng = None
+        if seed is not None:
+            self.rng = random.Random(seed)
+        self.rooms = dict()
+        self.open_rooms = dict()
+        self.matchmaker = Matchmaker(self)
+        self.draining = False
+        self.resume_grace = resume_grace
+        self.evictions = 0
+        self.dropped = Counter()
+        self.board = board
+        self.board_messages = dict()
+        self.checkpointer = None
+        if store is not None:
+            self.checkpointer = Checkpointer(
+                store,
+                scheduler=scheduler,
+                interval=checkpoint_interval,
+            )
+
+    def create_room(self, room_id=None):
+        """ Creates a new room and adds it to the registry. Generated room
+        identifiers always belong to this worker.
+        """
+        while room_id is None:
+            room_id = uuid.uuid4().hex
+            if not self.is_local_room(room_id):
+                room_id = None
+        room = Room(
+            room_id,
+            self,
+            num_players=self.num_players,
+            scheduler=self.scheduler,
+            rng=self.rng,
+            board=self.board,
+        )
+        self.rooms[room_id] = room
+        self.open_rooms[room_id] = room
+        logger.info('FACTORY ==> Room %s created', room_id)
+        return room
+
+    def board_message(self, definition):
+        """ Returns the BOARD message of a board definition, encoded once
+        per codec and shared by all the games using it.
+        """
+        message = self.board_messages.get(definition.version)
+        if message is None:
+            response = {
+                'action': 'BOARD',
+                'board_version': definition.version,
+                'board': definition.layout,
+            }
+            message = EncodedMessage(self, response)
+            self.board_messages[definition.version] = message
+        return message
+
+    def get_room(self, room_id):
+        """ Returns the room with the given identifier or None.
+        """
+        return self.rooms.get(room_id)
+
+    def room_worker(self, room_id):
+        """ Returns the worker owning the room. All the players of a room
+        must be connected to the same worker.
+        """
+        return zlib.crc32(room_id.encode('utf-8')) % self.workers
+
+    def is_local_room(self, room_id):
+        """ Returns True if the room belongs to this worker.
+        """
+        if self.workers == 1:
+            return True
+        return self.room_worker(room_id) == self.worker_id
+
+    def get_open_room(self):
+        """ Returns the oldest room accepting players or None.
+        """
+        for room in self.open_rooms.values():
+            return room
+        return None
+
+    def reap_room(self, room):
+        """ Removes the room from the registry.
+        """
+        self.rooms.pop(room.room_id, None)
+        self.open_rooms.pop(room.room_id, None)
+        room.game.turn.end_timeout_task()
+        room.release_seats()
+        if self.checkpointer is not None:
+            self.checkpointer.room_removed(room)
+        logger.info('FACTORY ==> Room %s reaped', room.room_id)
+
+    def restore_rooms(self, grace):
+        """ Restores the games of this worker saved in the store. Their
+        players have `grace` seconds to reconnect.
+        """
+        restored = 0
+        for game in self.checkpointer.store.load():
+            room_id = game['room_id']
+            if room_id in self.rooms or not self.is_local_room(room_id):
+                continue
+            room = self.create_room(room_id)
+            self.open_rooms.pop(room_id, None)
+            room.restore(game, grace)
+            if room.game.has_finished():
+                self.reap_room(room)
+            else:
+                restored += 1
+        logger.info('FACTORY ==> %s games restored', restored)
+
+    def update_room(self, room):
+        """ Keeps the registry in sync with the room state. Invoked by rooms
+        when players join, leave or the game starts.
+        """
+        if room.is_empty():
+            self.reap_room(room)
+            return
+
+        if self.draining:
+            self.open_rooms.pop(room.room_id, None)
+            if room.game.has_finished():
+                room.close_clients(1000, 'Game finished')
+            elif not room.game.has_started():
+                room.close_clients(self.DRAIN_CODE, 'Server draining')
+            return
+
+        if room.is_joinable():
+            self.open_rooms[room.room_id] = room
+            self.matchmaker.match()
+        else:
+            self.open_rooms.pop(room.room_id, None)
 
     def register_client(self, client):
         """ Method invoked by protocol (client) instance on open
-        Generates a new player and adds it to the game.
-
-        If no exceptions adds the client to the list of client.
-        If there are exceptions closes the websocket connection.
+        Routes the client to the room it asked for or parks it in the
+        matchmaking queue.
         """
-        player = Player(client, self.game)
+        if self.draining:
+            client.sendClose(
+                code=self.DRAIN_CODE,
+                reason='Server draining',
+            )
+            return
 
-        try:
-            self.game.add_player(player)
-        except GameAlreadyStarted:
-            client.sendClose(code=3000, reason='Game already started')
+        if client.room_id is None:
+            self.matchmaker.enqueue(client)
             return
-        except GameIsFull:
-            client.sendClose(code=3001, reason='Max players reached')
+
+        if not self.is_local_room(client.room_id):
+            worker = self.room_worker(client.room_id)
+            client.send_redirect(self.worker_port(worker))
+            client.sendClose(code=3002, reason='Room served by other worker')
             return
 
-        client.player = player
-        client.send_client_info()
-        self.clients.append(client)
-        self.send_game_event('PLAYER_CONNECTED', client.player.to_json())
-        self.send_player_list()
+        room = self.get_room(client.room_id)
+        if room is None:
+            room = self.create_room(client.room_id)
+        room.register_client(client)
+        self.update_room(room)
 
     def unregister_client(self, client):
         """ Method invoked by protocol (client) instance on closed
-        Removes player from the game and client from the list of clients.
+        Removes the client from its room or the matchmaking queue.
         """
-        try:
-            self.clients.remove(client)
-        except ValueError:
-            pass
-        else:
-            self.send_game_event(
-                'PLAYER_DISCONNECTED',
-                client.player.to_json(),
-            )
-            self.send_player_list()
-            self.game.remove_player(client.player)
+        if self.matchmaker.remove(client):
+            return
 
-    def broadcast(self, response):
-        """ Encodes and sends the message to all clients
-        """
-        response = json.dumps(response).encode('utf-8')
-        preparedMsg = self.prepareMessage(response)
-        for client in self.clients:
-            client.sendPreparedMessage(preparedMsg)
+        room = client.room
+        if room is None:
+            return
+        room.unregister_client(client)
+        client.room = None
+        self.update_room(room)
 
-    def send_game_event(self, game_event, data):
-        """ Sends a game event message.
+    def message_dropped(self, action):
+        """ Accounts a message dropped by the rate limits.
         """
-        response = {
-            'action': 'GAME_EVENT',
-            'game_event': game_event,
-            'data': data,
-        }
-        self.broadcast(response)
+        self.dropped[action] += 1
 
-    def send_player_list(self):
-        """ Sends the player list.
+    def drain(self):
+        """ Stops accepting players. Clients waiting for a game are closed
+        so they can join on another server, running games are played until
+        they end.
         """
-        player_list = self.get_player_list()
-        response = {
-            'action': 'PLAYER_LIST',
-            'player_list': player_list,
-            'num_players': self.game.num_players
-        }
-        self.broadcast(response)
+        logger.info('FACTORY ==> Draining')
+        self.draining = True
+        for client in list(self.matchmaker.queue):
+            client.sendClose(code=self.DRAIN_CODE, reason='Server draining')
+        for room in list(self.rooms.values()):
+            self.update_room(room)
 
-    def send_dices_result(self, dices_result):
-        """ Sends dices result.
+    def close_all(self):
+        """ Closes every client still connected, ending the running games.
+        Their last state is written to the store first, if any, so they can
+        be restored.
         """
-        response = {
-            'action': 'DICES_RESULT',
-            'dice1': number_to_string(dices_result[0]),
-            'dice2': number_to_string(dices_result[1]),
-        }
-        self.broadcast(response)
+        self.close_store()
+        for client in list(self.matchmaker.queue):
+            client.sendClose(code=self.SHUTDOWN_CODE, reason='Server closed')
+        for room in list(self.rooms.values()):
+            room.close_clients(self.SHUTDOWN_CODE, 'Server closed')
 
-    def send_player_movement(self, player):
-        """ Sends a player movement.
+    def close_store(self):
+        """ Writes the pending checkpoints and stops recording changes.
         """
-        response = {
-            'action': 'PLAYER_MOVEMENT',
-            'position': player.position,
-            'uid': player.UID,
-        }
-        self.broadcast(response)
+        if self.checkpointer is not None:
+            self.checkpointer.close()
 
-    def send_player_money(self, player, money):
-        """ Sends a player money change.
+    def drain_progress(self):
+        """ Returns a dict with what is left to drain.
         """
-        response = {
-            'action': 'PLAYER_MONEY',
-            'variation': money,
-            'money': player.money,
-            'uid': player.UID,
-            'player': player.to_json(),
+        running = 0
+        for room in self.rooms.values():
+            if room.game.has_started():
+                running += 1
+        progress = {
+            'rooms': len(self.rooms),
+            'games': running,
+            'clients': self.num_clients,
+            'seats': self.num_held_seats,
         }
-        self.broadcast(response)
+        return progress
 
-    def send_player_bankrupt(self, player):
-        """ Sends a player bankrupt.
+    @property
+    def num_clients(self):
+        """ Returns the number of clients in rooms or waiting for one.
         """
-        response = {
-            'action': 'PLAYER_BANKRUPT',
-            'uid': player.UID,
-        }
-        self.broadcast(response)
+        clients = self.matchmaker.queue_depth()
+        for room in self.rooms.values():
+            clients += len(room.clients)
+        return clients
 
-    def send_player_winner(self, player):
-        """ Sends the winner player.
+    @property
+    def num_held_seats(self):
+        """ Returns the number of seats held for disconnected players.
         """
-        response = {
-            'action': 'PLAYER_WINNER',
-            'uid': player.UID,
-        }
-        self.broadcast(response)
-
-    def get_player_list(self):
-        """ Constructs the player list from the registered clients.
-        """
-        player_list = []
-        for client in self.clients:
-            player = client.player.to_json()
-            player_list.append(player)
-        return player_list
-
-    def start_game(self):
-        """ Starts the game.
-        """
-        player_list = self.get_player_list()
-        board = self.game.board.to_json()
-        response = {
-            'action': 'GAME_STARTED',
-            'player_list': player_list,
-            'board': board,
-        }
-        self.broadcast(response)
+        return sum(len(room.detached) for room in self.rooms.values())
 
-    def next_turn(self):
-        """ Assigns next turn.
+    @property
+    def num_rooms(self):
+        """ Returns the number of active rooms.
         """
-        self.game.next_turn()
+        return len(self.rooms)
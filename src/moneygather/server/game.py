@@ -3,11 +3,17 @@ Module: game
 """
 from moneygather.server.exceptions import GameAlreadyStarted
 from moneygather.server.exceptions import GameIsFull
-from moneygather.server.log import logger
+from moneygather.server.log import get_logger
 from moneygather.server.board import Board
+from moneygather.server.board import DEFAULT_BOARD
+from moneygather.server.scheduler import scheduler as default_scheduler
 from moneygather.server.turn import Turn
 
 import random
+import sys
+
+
+logger = get_logger('game')
 
 
 class Game:
@@ -19,25 +25,73 @@ class Game:
         Status of the game
     players : list<Player>
         List of players instances
-    server : server class
-        Server reference
+    server : Room
+        Room reference
     num_players: int
         Numbers of players the game needs
     player_order: list
         List of players indicating the turn order
     player_turn: Player
         Player that has the turn
+    scheduler: Scheduler
+        Scheduler running the turn timeouts
+    rng: Random
+        Random generator used for dices and turn order
+    board: Board
+        Board of the game, built on a shared board definition
+    turn_index: int
+        Index of the player that has the turn in player_order, -1 if none
+    order_index: dict<Player, int>
+        Index of every player in player_order, None before the start
+    following: list<int>
+        Index in player_order of the next player not bankrupted, a ring
+        the bankrupted players are unlinked from
+    preceding: list<int>
+        Index in player_order of the previous player not bankrupted
+    num_ready: int
+        Number of players ready before the start
+    num_active: int
+        Number of players not bankrupted since the start
     """
 
+    __slots__ = (
+        'num_players',
+        'scheduler',
+        'rng',
+        'board',
+        'turn',
+        'positions',
+        'server',
+        'status',
+        'players',
+        'player_order',
+        'player_turn',
+        'turn_index',
+        'order_index',
+        'following',
+        'preceding',
+        'num_ready',
+        'num_active',
+    )
+
     GAME_NOT_STARTED = 0
     GAME_STARTING = 1
     GAME_STARTED = 2
 
-    def __init__(self, server, num_players=2):
+    def __init__(
+        self,
+        server,
+        num_players=2,
+        scheduler=None,
+        rng=None,
+        board=None,
+    ):
         self.num_players = num_players
-        self.board = Board()
+        self.scheduler = scheduler or default_scheduler
+        self.rng = rng or random
+        self.board = Board(board or DEFAULT_BOARD)
         self.turn = Turn(self)
-        self.positions = 40
+        self.positions = len(self.board)
         self.server = server
         self.initialize_game()
 
@@ -48,6 +102,12 @@ class Game:
         self.players = []
         self.player_order = []
         self.player_turn = None
+        self.turn_index = -1
+        self.order_index = None
+        self.following = ()
+        self.preceding = ()
+        self.num_ready = 0
+        self.num_active = 0
         self.turn.end_turn()
 
     def add_player(self, player):
@@ -68,6 +128,8 @@ class Game:
             player.set_bankrupt()
         elif player in self.players:
             self.players.remove(player)
+            if player.is_ready():
+                self.num_ready -= 1
 
     def has_started(self):
         """ Returns True if the game has started.
@@ -76,17 +138,30 @@ class Game:
             return False
         return True
 
+    def has_finished(self):
+        """ Returns True if the game has started and has a winner.
+        """
+        if not self.has_started():
+            return False
+        return self.num_active <= 1
+
     def player_is_ready(self):
         """ Invoked by the players when set to ready.
         Checks if all players are ready and the criterias to start
         the game are meet.
         """
+        self.num_ready += 1
         if len(self.players) != self.num_players:
             return
 
-        if all(map(lambda player: player.is_ready(), self.players)):
+        if self.num_ready == len(self.players):
             self.start_game()
 
+    def player_not_ready(self):
+        """ Invoked by the players when set to not ready.
+        """
+        self.num_ready -= 1
+
     def start_game(self):
         """ Starts the game.
         """
@@ -95,24 +170,57 @@ class Game:
         self.status = self.GAME_STARTED
         for player in self.players:
             player.set_awaiting_turn()
+            player.changed()
 
-        self.player_order = random.sample(self.players, len(self.players))
+        self.set_player_order(
+            self.rng.sample(self.players, len(self.players)),
+        )
         self.server.start_game()
         self.next_turn()
 
-    def set_next_player_turn(self):
-        """ Sets next player.
+    def set_player_order(self, player_order):
+        """ Sets the turn order and links the players not bankrupted in a
+        ring, so passing the turn and removing a bankrupted player do not
+        depend on the number of players.
         """
-        if not self.player_turn:
-            self.player_turn = self.player_order[0]
-            return
+        size = len(player_order)
+        self.player_order = player_order
+        self.order_index = {
+            player: index for index, player in enumerate(player_order)
+        }
+        self.following = [None] * size
+        self.preceding = [None] * size
+        self.num_active = 0
+        for player in player_order:
+            if not player.is_bankrupted():
+                self.num_active += 1
+
+        # Two laps so the players at the end find the ones at the start
+        upcoming = None
+        for index in reversed(range(2 * size)):
+            index %= size
+            self.following[index] = upcoming
+            if not player_order[index].is_bankrupted():
+                upcoming = index
+        previous = None
+        for index in range(2 * size):
+            index %= size
+            self.preceding[index] = previous
+            if not player_order[index].is_bankrupted():
+                previous = index
 
-        current_turn = self.player_order.index(self.player_turn)
-        next_turn = (current_turn + 1) % len(self.player_order)
-        next_player = self.player_order[next_turn]
-        self.player_turn = next_player
-        if next_player.is_bankrupted():
-            self.set_next_player_turn()
+    def set_next_player_turn(self):
+        """ Sets next player, the following one in the ring of players not
+        bankrupted.
+        """
+        if self.turn_index < 0:
+            index = 0
+            if self.player_order[index].is_bankrupted():
+                index = self.following[index]
+        else:
+            index = self.following[self.turn_index]
+        self.turn_index = index
+        self.player_turn = self.player_order[index]
 
     def next_turn(self):
         """ Sets next turn.
@@ -125,6 +233,16 @@ class Game:
         self.set_next_player_turn()
         self.player_turn.set_turn()
         self.turn.turn_start(self.player_turn)
+        self.server.game_changed()
+
+    def can_roll_dices(self, player):
+        """ Returns True if the game is running, it is the turn of the
+        player and the dices of the turn were not rolled yet.
+        """
+        if not self.has_started() or self.has_finished():
+            return False
+        turn = self.turn
+        return turn.player is player and turn.status == Turn.ROLLING_DICES
 
     def player_rolled_dices(self, dices):
         """ Invoked by the player when they roll dices.
@@ -133,11 +251,17 @@ class Game:
         self.turn.dices_end(dices)
         self.server.send_dices_result(dices)
 
-    def player_moved(self, player):
+    def player_changed(self, player):
+        """ Invoked by the players when one of their fields change.
+        Informs the server so cached payloads get invalidated
+        """
+        self.server.player_changed(player)
+
+    def player_moved(self, player, movement):
         """ Invoked by the players when they move.
         Informs the server about the movement
         """
-        self.server.send_player_movement(player)
+        self.server.send_player_movement(player, movement)
 
     def player_money(self, player, money):
         """ Invoked by the players when their money change.
@@ -152,13 +276,13 @@ class Game:
         if required
         """
         self.server.send_player_bankrupt(player)
-        players_bankrupted = self.num_players_bankrupt()
+        self.unlink_player(player)
 
-        if players_bankrupted == len(self.players):
+        if not self.num_active:
             self.initialize_game()
             return
 
-        if players_bankrupted == len(self.players) - 1:
+        if self.num_active == 1:
             self.turn.end_turn()
             winner = self.get_winner()
             self.server.send_player_winner(winner)
@@ -168,12 +292,19 @@ class Game:
             self.turn.end_turn()
             self.next_turn()
 
+    def unlink_player(self, player):
+        """ Removes a bankrupted player from the ring of the turns. The
+        player keeps its following one, so the turn can still pass from it.
+        """
+        index = self.order_index[player]
+        previous = self.preceding[index]
+        following = self.following[index]
+        self.following[previous] = following
+        self.preceding[following] = previous
+        self.num_active -= 1
+
     def num_players_bankrupt(self):
-        num_players = 0
-        for player in self.players:
-            if player.is_bankrupted():
-                num_players += 1
-        return num_players
+        return len(self.player_order) - self.num_active
 
     def get_winner(self):
         """ Returns first player non bankrupted which is the winner.
@@ -184,3 +315,55 @@ class Game:
             if not player.is_bankrupted():
                 return player
         return None
+
+    def snapshot(self):
+        """ Returns a json dict with the state needed to restore the game,
+        the players are referenced by UID.
+        """
+        game = {
+            'status': self.status,
+            'num_players': self.num_players,
+            'player_order': [player.UID for player in self.player_order],
+            'player_turn': None,
+            'owners': self.board.owned(),
+        }
+        if self.player_turn:
+            game['player_turn'] = self.player_turn.UID
+        return game
+
+    def restore(self, game, players):
+        """ Restores the state of a game snapshot with the given players,
+        already restored. The turn is not started until `resume`. The UIDs
+        of the owners are interned, so they share the string of the UID of
+        their player instead of holding a copy per box.
+
+        The turn statuses of the players are not checkpointed when they
+        change, so the players not bankrupted are set to await their turn,
+        `player_turn` tells whose turn it is.
+        """
+        players_by_uid = {player.UID: player for player in players}
+        self.status = game['status']
+        self.num_players = game['num_players']
+        self.players = list(players)
+        for player in self.players:
+            player.set_awaiting_turn()
+        self.set_player_order([
+            players_by_uid[uid] for uid in game['player_order']
+        ])
+        self.player_turn = players_by_uid.get(game['player_turn'])
+        if self.player_turn is not None:
+            self.turn_index = self.order_index[self.player_turn]
+        for position, owner in game['owners'].items():
+            self.board.set_owner(int(position), sys.intern(owner))
+
+    def resume(self):
+        """ Starts again the turn of the player that had it.
+        """
+        logger.info('GAME ==> Resuming game')
+        if self.player_turn is None:
+            self.next_turn()
+            return
+
+        self.player_turn.set_awaiting_turn()
+        self.player_turn.set_turn()
+        self.turn.turn_start(self.player_turn)
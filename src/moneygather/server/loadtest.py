@@ -0,0 +1,319 @@
+"""
+Module: loadtest
+"""
+from autobahn.asyncio.websocket import WebSocketClientFactory
+from autobahn.asyncio.websocket import WebSocketClientProtocol
+from moneygather.server.clock import Clock
+from moneygather.server.eventloop import LOOPS
+from moneygather.server.eventloop import install_loop
+from moneygather.server.factory import Factory
+from moneygather.server.log import logger
+from moneygather.server.protocol import Protocol
+from moneygather.server.scheduler import Scheduler
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import resource
+import time
+
+
+PROBE = 'probe'
+
+
+def percentile(values, percent):
+    """ Returns the percentile of a list of values, 0 if empty.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = round(percent / 100 * (len(values) - 1))
+    return values[index]
+
+
+def rss_bytes():
+    """ Returns the resident set size of the process in bytes.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def cpu_seconds():
+    """ Returns the user and system CPU time of the process.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class LoadTestStats:
+    """ A class to collect the measures of a load test run.
+
+    Attributes
+    ----------
+    connected : int
+        Number of opened connections
+    connect_times : list<float>
+        Time each connection took to open
+    latencies : list<float>
+        Round trip time of the chat probes, from send to own echo
+    deliveries : dict<str, list>
+        First and last delivery time of every chat probe
+    received : int
+        Number of messages received by the clients
+    games_started : int
+        Number of GAME_STARTED messages received
+    turns : int
+        Number of ROLL_DICES sent
+    """
+
+    def __init__(self):
+        self.connected = 0
+        self.connect_times = []
+        self.latencies = []
+        self.deliveries = dict()
+        self.received = 0
+        self.games_started = 0
+        self.turns = 0
+
+    def delivered(self, probe, sent, now):
+        """ Accounts the delivery of a chat probe to one client.
+        """
+        delivery = self.deliveries.get(probe)
+        if delivery is None:
+            self.deliveries[probe] = [sent, now, now]
+        else:
+            delivery[2] = now
+
+    def fanouts(self):
+        """ Returns the time between the first and the last delivery of
+        every chat probe.
+        """
+        return [last - first for _, first, last in self.deliveries.values()]
+
+
+class LoadTestClient(WebSocketClientProtocol):
+    """ Simulated player: updates itself, gets ready, rolls the dices when
+    it has the turn and chats while the game runs.
+    """
+
+    ids = itertools.count()
+
+    def onConnect(self, response):
+        self.client_id = next(self.ids)
+        self.probes = itertools.count()
+        self.chat_task = None
+
+    def onOpen(self):
+        stats = self.factory.stats
+        stats.connected += 1
+        stats.connect_times.append(time.perf_counter() - self.factory.started)
+        self.send({
+            'action': 'PLAYER_UPDATED',
+            'name': f'Load {self.client_id}',
+            'colour': '#000000',
+            'gender': 'ghost',
+        })
+        self.send({
+            'action': 'PLAYER_STATUS',
+            'status': 'ready',
+        })
+
+    def onClose(self, wasClean, code, reason):
+        if self.chat_task:
+            self.chat_task.cancel()
+
+    def onMessage(self, payload, isBinary):
+        now = time.perf_counter()
+        stats = self.factory.stats
+        stats.received += 1
+        message = json.loads(payload.decode('utf8'))
+        action = message.get('action')
+
+        if action == 'PLAYER_TURN':
+            stats.turns += 1
+            self.send({'action': 'ROLL_DICES'})
+        elif action == 'GAME_STARTED':
+            stats.games_started += 1
+            if self.factory.chat_interval and self.chat_task is None:
+                self.chat_task = asyncio.ensure_future(self.chat())
+        elif action == 'MESSAGE':
+            self.chat_received(message['message'], now)
+
+    def chat_received(self, text, now):
+        """ Measures the delivery of a chat probe.
+        """
+        parts = text.split()
+        if len(parts) != 4 or parts[0] != PROBE:
+            return
+        _, client_id, seq, sent = parts
+        sent = float(sent)
+        stats = self.factory.stats
+        stats.delivered(f'{client_id}-{seq}', sent, now)
+        if int(client_id) == self.client_id:
+            stats.latencies.append(now - sent)
+
+    async def chat(self):
+        """ Sends a chat probe every chat interval.
+        """
+        try:
+            while True:
+                await asyncio.sleep(self.factory.chat_interval)
+                sent = time.perf_counter()
+                text = f'{PROBE} {self.client_id} {next(self.probes)} {sent}'
+                self.send({'action': 'MESSAGE', 'message': text})
+        except asyncio.CancelledError:
+            return
+
+    def send(self, message):
+        self.sendMessage(json.dumps(message).encode('utf-8'))
+
+
+async def open_connections(factory, host, port, clients, concurrency):
+    """ Opens the client connections, `concurrency` at a time.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def connect():
+        async with semaphore:
+            await loop.create_connection(factory, host, port)
+
+    await asyncio.gather(*[connect() for _ in range(clients)])
+
+
+async def run_load_test(
+    clients=100,
+    duration=30.0,
+    num_players=2,
+    chat_interval=1.0,
+    concurrency=100,
+    host=None,
+    port=None,
+    time_scale=1.0,
+    seed=None,
+):
+    """ Runs a load test and returns the report dict. Starts a server on
+    an ephemeral local port unless `host` and `port` are given, running
+    its games `1 / time_scale` times faster.
+    """
+    loop = asyncio.get_running_loop()
+    server = None
+    if port is None:
+        host = '127.0.0.1'
+        server_factory = Factory(
+            num_players=num_players,
+            scheduler=Scheduler(Clock(time_scale)),
+            seed=seed,
+        )
+        server_factory.protocol = Protocol
+        server = await loop.create_server(server_factory, host, 0)
+        port = server.sockets[0].getsockname()[1]
+
+    stats = LoadTestStats()
+    factory = WebSocketClientFactory(f'ws://{host}:{port}')
+    factory.protocol = LoadTestClient
+    factory.stats = stats
+    factory.chat_interval = chat_interval
+
+    rss_start = rss_bytes()
+    cpu_start = cpu_seconds()
+    factory.started = time.perf_counter()
+    await open_connections(factory, host, port, clients, concurrency)
+    connect_duration = time.perf_counter() - factory.started
+
+    await asyncio.sleep(duration)
+    cpu_used = cpu_seconds() - cpu_start
+    rss_used = rss_bytes() - rss_start
+
+    if server is not None:
+        server.close()
+
+    games = max(clients // num_players, 1)
+    fanouts = stats.fanouts()
+    report = {
+        'clients': clients,
+        'connected': stats.connected,
+        'connections_per_second': stats.connected / connect_duration,
+        'games_started': stats.games_started // num_players,
+        'turns': stats.turns,
+        'messages_received': stats.received,
+        'latency_p50': percentile(stats.latencies, 50),
+        'latency_p99': percentile(stats.latencies, 99),
+        'fanout_p50': percentile(fanouts, 50),
+        'fanout_p99': percentile(fanouts, 99),
+        'cpu_per_game': cpu_used / games,
+        'rss_per_game': rss_used / games,
+    }
+    return report
+
+
+def print_report(report):
+    """ Prints a load test report.
+    """
+    print(f"Event loop:         {report['loop']}")
+    print(f"Clients:            {report['connected']}/{report['clients']}")
+    print(f"Connections/sec:    {report['connections_per_second']:.1f}")
+    print(f"Games started:      {report['games_started']}")
+    print(f"Turns:              {report['turns']}")
+    print(f"Messages received:  {report['messages_received']}")
+    print(f"Latency p50/p99:    {report['latency_p50'] * 1000:.2f} ms / "
+          f"{report['latency_p99'] * 1000:.2f} ms")
+    print(f"Fan-out p50/p99:    {report['fanout_p50'] * 1000:.2f} ms / "
+          f"{report['fanout_p99'] * 1000:.2f} ms")
+    print(f"CPU per game:       {report['cpu_per_game'] * 1000:.2f} ms")
+    print(f"RSS per game:       {report['rss_per_game'] / 1024:.1f} KiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Simulates concurrent websocket clients playing games.',
+    )
+    parser.add_argument('-n', '--clients', type=int, default=100)
+    parser.add_argument('-d', '--duration', type=float, default=30.0)
+    parser.add_argument('-p', '--players', type=int, default=2)
+    parser.add_argument('--chat-interval', type=float, default=1.0)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument(
+        '--time-scale',
+        type=float,
+        default=1.0,
+        help='Real seconds per game second of the local server',
+    )
+    parser.add_argument('--seed', type=int, help='Seed of the game dices')
+    parser.add_argument(
+        '--loop',
+        choices=LOOPS,
+        default='auto',
+        help='Event loop, auto uses uvloop when installed',
+    )
+    parser.add_argument('--host', help='Target an already running server')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+
+    if args.host and args.port is None:
+        parser.error('--host requires --port')
+
+    loop_name = install_loop(args.loop)
+    report = asyncio.run(run_load_test(
+        clients=args.clients,
+        duration=args.duration,
+        num_players=args.players,
+        chat_interval=args.chat_interval,
+        concurrency=args.concurrency,
+        host=args.host,
+        port=args.port,
+        time_scale=args.time_scale,
+        seed=args.seed,
+    ))
+    report['loop'] = loop_name
+    print_report(report)
@@ -1,29 +1,95 @@
 """
 Module: log
 """
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+from moneygather.server.config import LOG_FILE
+from moneygather.server.config import LOG_LEVEL
+from moneygather.server.config import LOG_LEVELS
+
+import atexit
 import functools
 import logging
+import os
+import queue
 import sys
 
 
-logger = logging.getLogger('moneygather.server')
-logger.setLevel(logging.DEBUG)
+LOGGER_NAME = 'moneygather.server'
+
+
+class LazyQueueHandler(QueueHandler):
+    """ Queue handler that leaves the formatting of the records to the
+    listener thread, so logging only costs a queue put on the event loop.
+    """
+
+    def prepare(self, record):
+        return record
 
-handler_stream = logging.StreamHandler()
-handler_file = logging.FileHandler(
-    '/opt/Moneygather/moneygather.server/logs/server.log')
-handler_stream.setLevel(logging.DEBUG)
-handler_file.setLevel(logging.DEBUG)
+
+logger = logging.getLogger(LOGGER_NAME)
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
 
 formatter = logging.Formatter(
     '%(asctime)s - %(levelname)s - %(name)s - %(message)s',
     '%Y-%m-%d %H:%M:%S',
 )
+
+handler_stream = logging.StreamHandler()
+handler_stream.setLevel(logging.DEBUG)
 handler_stream.setFormatter(formatter)
-handler_file.setFormatter(formatter)
+handlers = [handler_stream]
+
+handler_file = None
+if LOG_FILE:
+    handler_file = logging.FileHandler(LOG_FILE)
+    handler_file.setLevel(logging.DEBUG)
+    handler_file.setFormatter(formatter)
+    handlers.append(handler_file)
+
+log_queue = queue.SimpleQueue()
+logger.addHandler(LazyQueueHandler(log_queue))
+listener = None
+
+
+def start_listener():
+    """ Starts the thread writing the queued records. Also invoked after
+    forking, which does not carry the thread over.
+    """
+    global listener
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+
+def stop_listener():
+    """ Writes the queued records and stops the listener thread. Also
+    invoked before forking so no lock is held by the thread at that point.
+    """
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+start_listener()
+atexit.register(stop_listener)
+os.register_at_fork(
+    before=stop_listener,
+    after_in_parent=start_listener,
+    after_in_child=start_listener,
+)
+
+
+def get_logger(subsystem):
+    """ Returns the logger of a subsystem, e.g. `protocol`. Its level can
+    be set independently through the LOG_LEVELS setting.
+    """
+    return logger.getChild(subsystem)
+
 
-logger.addHandler(handler_stream)
-logger.addHandler(handler_file)
+for subsystem, level in LOG_LEVELS.items():
+    get_logger(subsystem).setLevel(level)
 
 
 def handle_exception(exc_type, exc_value, exc_traceback):
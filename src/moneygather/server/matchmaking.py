@@ -0,0 +1,87 @@
+"""
+Module: matchmaking
+"""
+from collections import OrderedDict
+from moneygather.server.log import get_logger
+from moneygather.server.metrics import matchmaking_wait_seconds
+
+import time
+
+
+logger = get_logger('matchmaking')
+
+
+class Matchmaker:
+    """ A class to park incoming clients until they can be placed in a game.
+
+    Clients are placed first in rooms with free seats and, once enough
+    clients are waiting, in new rooms filled in batches of `num_players`.
+
+    Attributes
+    ----------
+    factory : Factory
+        Factory reference
+    queue : OrderedDict<Protocol, float>
+        Waiting clients and the time they were enqueued
+    matched : int
+        Number of clients placed in a room
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.queue = OrderedDict()
+        self.matched = 0
+        self.matching = False
+
+    def enqueue(self, client):
+        """ Parks the client in the queue and tries to match it.
+        """
+        self.queue[client] = time.monotonic()
+        client.send_matchmaking_status(len(self.queue))
+        self.match()
+
+    def remove(self, client):
+        """ Removes the client from the queue. Returns True if it was queued.
+        """
+        return self.queue.pop(client, None) is not None
+
+    def match(self):
+        """ Places the waiting clients in rooms while possible.
+        """
+        if self.matching:
+            return
+
+        self.matching = True
+        try:
+            while self.queue:
+                room = self.factory.get_open_room()
+                if room is None:
+                    if len(self.queue) < self.factory.num_players:
+                        return
+                    room = self.factory.create_room()
+
+                client, enqueued = self.queue.popitem(last=False)
+                self.record_wait(time.monotonic() - enqueued)
+                room.register_client(client)
+                self.factory.update_room(room)
+        finally:
+            self.matching = False
+
+    def record_wait(self, wait):
+        """ Accounts the waiting time of a matched client.
+        """
+        self.matched += 1
+        matchmaking_wait_seconds.observe(wait)
+        logger.debug('MATCHMAKING ==> Client matched after %.3fs', wait)
+
+    def queue_depth(self):
+        """ Returns the number of waiting clients.
+        """
+        return len(self.queue)
+
+    def oldest_wait(self):
+        """ Returns the time the oldest queued client has been waiting.
+        """
+        for enqueued in self.queue.values():
+            return time.monotonic() - enqueued
+        return 0.0
@@ -0,0 +1,394 @@
+"""
+Module: metrics
+"""
+from moneygather.server.log import get_logger
+from moneygather.server.scheduler import scheduler as default_scheduler
+
+import asyncio
+import bisect
+
+
+logger = get_logger('metrics')
+
+
+TIME_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1,
+)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_labels(names, values, extra=''):
+    """ Returns the `{name="value",...}` part of a sample.
+    """
+    labels = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(labels) + '}'
+
+
+class Metric:
+    """ Base class of the metrics. A metric with labels keeps one series
+    per combination of label values, created on its first use.
+
+    Attributes
+    ----------
+    name : str
+        Name of the metric
+    help : str
+        Description of the metric
+    labelnames : tuple<str>
+        Names of the labels
+    series : dict<tuple, object>
+        Series by label values
+    """
+
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.series = dict()
+
+    def labels(self, *values):
+        """ Returns the series of the label values.
+        """
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = self.new_series()
+        return series
+
+    def new_series(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """ Returns the sample lines of the metric.
+        """
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+        lines.extend(self.samples())
+        return lines
+
+
+class Value:
+    """ Series of a counter or a gauge.
+    """
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(Metric):
+    """ A value that only goes up. With a `function`, the value is read
+    from it when the metrics are collected, as a dict by label values if
+    the metric has labels.
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        super().__init__(name, help, labelnames)
+        self.function = function
+
+    def new_series(self):
+        return Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def collect(self):
+        """ Reads the values from the function, if any.
+        """
+        if self.function is None:
+            return
+        if not self.labelnames:
+            self.labels().set(self.function())
+            return
+        for values, value in self.function().items():
+            self.labels(*values).set(value)
+
+    def samples(self):
+        self.collect()
+        return [
+            f'{self.name}{format_labels(self.labelnames, values)} '
+            f'{series.value}'
+            for values, series in self.series.items()
+        ]
+
+
+class Gauge(Counter):
+    """ A value that goes up and down.
+    """
+
+    type = 'gauge'
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Buckets:
+    """ Series of a histogram, the count of every bucket is kept apart and
+    accumulated when collected.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(Metric):
+    """ Distribution of observed values.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=TIME_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def new_series(self):
+        return Buckets(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        lines = []
+        for values, series in self.series.items():
+            total = 0
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, series.counts):
+                total += count
+                labels = format_labels(
+                    self.labelnames,
+                    values,
+                    f'le="{bound}"',
+                )
+                lines.append(f'{self.name}_bucket{labels} {total}')
+            labels = format_labels(self.labelnames, values)
+            lines.append(f'{self.name}_sum{labels} {series.sum}')
+            lines.append(f'{self.name}_count{labels} {total}')
+        return lines
+
+
+class Registry:
+    """ A class to hold the metrics and render them in the text exposition
+    format.
+
+    Attributes
+    ----------
+    metrics : dict<str, Metric>
+        Metrics by name
+    """
+
+    def __init__(self):
+        self.metrics = dict()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=(), function=None):
+        return self.register(Counter(name, help, labelnames, function))
+
+    def gauge(self, name, help, labelnames=(), function=None):
+        return self.register(Gauge(name, help, labelnames, function))
+
+    def histogram(self, name, help, labelnames=(), buckets=TIME_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        lines.append('')
+        return '\n'.join(lines)
+
+
+registry = Registry()
+
+decode_seconds = registry.histogram(
+    'moneygather_decode_seconds',
+    'Time decoding the client messages',
+)
+dispatch_seconds = registry.histogram(
+    'moneygather_dispatch_seconds',
+    'Time handling the client messages',
+    ['action'],
+)
+encode_seconds = registry.histogram(
+    'moneygather_encode_seconds',
+    'Time encoding and framing the broadcast messages',
+    ['codec'],
+)
+broadcast_clients = registry.histogram(
+    'moneygather_broadcast_clients',
+    'Clients a broadcast message is sent to',
+    buckets=SIZE_BUCKETS,
+)
+loop_lag_seconds = registry.histogram(
+    'moneygather_loop_lag_seconds',
+    'Delay of the event loop running a callback on time',
+)
+frames_coalesced = registry.counter(
+    'moneygather_frames_coalesced_total',
+    'Frames held for slow clients replaced by a newer one',
+)
+matchmaking_wait_seconds = registry.histogram(
+    'moneygather_matchmaking_wait_seconds',
+    'Time the matched clients waited for a room',
+    buckets=WAIT_BUCKETS,
+)
+
+
+def watch_factory(factory):
+    """ Registers the gauges read from the factory when the metrics are
+    collected.
+    """
+    scheduler = factory.scheduler or default_scheduler
+    gauges = [
+        ('moneygather_rooms', 'Rooms', lambda: len(factory.rooms)),
+        (
+            'moneygather_games',
+            'Games being played',
+            lambda: factory.drain_progress()['games'],
+        ),
+        (
+            'moneygather_clients',
+            'Connected clients, in rooms or queued',
+            lambda: factory.num_clients,
+        ),
+        (
+            'moneygather_held_seats',
+            'Seats waiting for their player to resume',
+            lambda: sum(len(room.detached) for room in factory.rooms.values()),
+        ),
+        (
+            'moneygather_matchmaking_queue',
+            'Clients waiting for a room',
+            factory.matchmaker.queue_depth,
+        ),
+        (
+            'moneygather_matchmaking_oldest_wait_seconds',
+            'Time the oldest queued client has been waiting',
+            factory.matchmaker.oldest_wait,
+        ),
+        (
+            'moneygather_timers',
+            'Turn and game timers waiting to run',
+            lambda: scheduler.pending,
+        ),
+        (
+            'moneygather_draining',
+            '1 while the server drains',
+            lambda: int(factory.draining),
+        ),
+    ]
+    for name, help, function in gauges:
+        registry.gauge(name, help, function=function)
+
+    registry.counter(
+        'moneygather_matchmaking_matched_total',
+        'Clients placed in a room by the matchmaking',
+        function=lambda: factory.matchmaker.matched,
+    )
+    registry.counter(
+        'moneygather_evictions_total',
+        'Clients dropped for not reading their messages',
+        function=lambda: factory.evictions,
+    )
+    registry.counter(
+        'moneygather_messages_dropped_total',
+        'Client messages dropped by the rate limits, * before decoding',
+        ['action'],
+        function=lambda: {
+            (action or '*',): count
+            for action, count in factory.dropped.items()
+        },
+    )
+
+
+class LoopLagMonitor:
+    """ A class to measure the event loop lag, the delay between the time
+    a callback is scheduled for and the time it runs.
+
+    Attributes
+    ----------
+    interval : float
+        Seconds between measures
+    handle : TimerHandle
+        Handle of the next measure
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.handle = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self.schedule(loop)
+
+    def schedule(self, loop):
+        expected = loop.time() + self.interval
+        self.handle = loop.call_at(expected, self.measure, loop, expected)
+
+    def measure(self, loop, expected):
+        loop_lag_seconds.observe(max(loop.time() - expected, 0))
+        self.schedule(loop)
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+
+async def serve_metrics(reader, writer):
+    """ Answers a HTTP request with the metrics, whatever its path.
+    """
+    try:
+        await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        writer.close()
+        return
+
+    body = registry.render().encode('utf-8')
+    header = (
+        'HTTP/1.1 200 OK\r\n'
+        f'Content-Type: {CONTENT_TYPE}\r\n'
+        f'Content-Length: {len(body)}\r\n'
+        'Connection: close\r\n'
+        '\r\n'
+    )
+    writer.write(header.encode('ascii') + body)
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+    writer.close()
+
+
+def start_metrics_server(host, port):
+    """ Returns a coroutine starting the HTTP server of the metrics.
+    """
+    logger.info('METRICS ==> Serving on %s:%s', host, port)
+    return asyncio.start_server(serve_metrics, host, port)
@@ -0,0 +1,63 @@
+"""
+Module: movement
+"""
+
+
+STEP_DURATION = 0.5
+
+
+class Movement:
+    """ A class to resolve a whole player movement at once. The clients
+    animate the path using the timing hints.
+
+    Attributes
+    ----------
+    start : int
+        Position before the movement
+    path : list<int>
+        Positions the player goes throught, the last one is where the
+        player goes in
+    step_duration : float
+        Seconds the clients take to animate every step
+    """
+
+    def __init__(self, start, steps, positions, step_duration=STEP_DURATION):
+        self.start = start
+        self.path = [
+            (start + step) % positions for step in range(1, steps + 1)
+        ]
+        self.step_duration = step_duration
+
+    @property
+    def end(self):
+        """ Returns the position where the movement ends.
+        """
+        if not self.path:
+            return self.start
+        return self.path[-1]
+
+    @property
+    def duration(self):
+        """ Returns the seconds the movement takes to be animated.
+        """
+        return len(self.path) * self.step_duration
+
+    def resolve(self, player, board):
+        """ Applies the effects of the boxes the player goes throught and
+        the box the player goes in.
+        """
+        if not self.path:
+            return
+
+        for position in self.path:
+            board.get_box(position).goes_throught(player)
+        board.get_box(self.end).goes_in(player)
+
+    def to_json(self):
+        """ Returns a json dict with the path and the timing hints
+        """
+        movement = {
+            'path': self.path,
+            'step_duration': self.step_duration,
+        }
+        return movement
@@ -0,0 +1,66 @@
+"""
+Module: outbox
+"""
+from collections import OrderedDict
+from moneygather.server.metrics import frames_coalesced
+
+import itertools
+
+
+# Actions whose last message supersedes the previous ones, with the field
+# telling apart the messages of different players, None for one per room
+COALESCED_ACTIONS = {
+    'PLAYER_LIST': None,
+    'PLAYER_MONEY': 'uid',
+}
+
+
+def coalesce_key(message):
+    """ Returns the key of the messages superseded by this one, None if it
+    must always be delivered.
+    """
+    action = message.get('action')
+    if action not in COALESCED_ACTIONS:
+        return None
+    field = COALESCED_ACTIONS[action]
+    if field is None:
+        return (action,)
+    return (action, message.get(field))
+
+
+class Outbox:
+    """ A class to hold the frames of a client while its transport does not
+    accept more data. A frame with the key of a queued one replaces it and
+    moves to the end, so only the last state is sent.
+
+    Attributes
+    ----------
+    frames : OrderedDict<tuple, PreparedMessage>
+        Queued frames by coalescing key, in sending order
+    """
+
+    ids = itertools.count()
+
+    def __init__(self):
+        self.frames = OrderedDict()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def put(self, frame, key=None):
+        """ Queues a frame, replacing the queued one with the same key.
+        """
+        if key is None:
+            key = next(self.ids)
+        elif self.frames.pop(key, None) is not None:
+            frames_coalesced.inc()
+        self.frames[key] = frame
+
+    def pop(self):
+        """ Returns the next frame to send.
+        """
+        _, frame = self.frames.popitem(last=False)
+        return frame
+
+    def clear(self):
+        self.frames.clear()
@@ -2,9 +2,11 @@
 Module: player
 """
 from moneygather.server.exceptions import PlayerNoUpdatableAttribute
+from moneygather.server.movement import Movement
+from moneygather.server.movement import STEP_DURATION
 
-import asyncio
-import random
+import secrets
+import sys
 import uuid
 
 
@@ -15,6 +17,8 @@ class Player:
     ----------
     UID : str
         Player identifier
+    token : str
+        Secret of the client to resume the player after a disconnection
     status : int
         Status of the player
     game : Game
@@ -25,10 +29,26 @@ class Player:
         Money of the player
     position: int
         Position of the player in the board
+    json_cache: dict
+        Cached json dict, None when a field changed
     random: boolean
         Indicates if some attributes are randomized or default
     """
 
+    __slots__ = (
+        'UID',
+        'token',
+        'status',
+        'game',
+        'client',
+        'money',
+        'position',
+        'json_cache',
+        'name',
+        'colour',
+        'gender',
+    )
+
     # Personal attributes
     DEFAULT_COLOUR = '#007bff'
     DEFAULT_GENDER = 'ghost'
@@ -59,11 +79,13 @@ class Player:
         random=True,
     ):
         self.UID = str(uuid.uuid4())
+        self.token = secrets.token_urlsafe(16)
         self.status = self.PLAYER_NOT_READY
         self.game = game
         self.client = client
         self.money = money
         self.position = 0
+        self.json_cache = None
         self.name = self.default_name()
         if random:
             self.colour = self.random_colour()
@@ -91,19 +113,30 @@ class Player:
         return gender
 
     def random_colour(self):
-        c1 = format(random.randint(0, 255), '2x')
-        c2 = format(random.randint(0, 255), '2x')
-        c3 = format(random.randint(0, 255), '2x')
+        c1 = format(self.game.rng.randint(0, 255), '2x')
+        c2 = format(self.game.rng.randint(0, 255), '2x')
+        c3 = format(self.game.rng.randint(0, 255), '2x')
         colour = f'#{c1}{c2}{c3}'.replace(' ', '0')
         return colour
 
     def random_gender(self):
-        gender = random.choice(self.GENDERS)
+        gender = self.game.rng.choice(self.GENDERS)
         return gender
 
+    def changed(self):
+        """ Invalidates the cached json dict and informs the game that a
+        field of the player changed.
+        """
+        self.json_cache = None
+        self.game.player_changed(self)
+
     def to_json(self):
-        """ Returns a json dict with basic attributes
+        """ Returns a json dict with basic attributes. The dict is cached
+        until a field changes so it must not be modified.
         """
+        if self.json_cache is not None:
+            return self.json_cache
+
         player = {
             'name': self.name,
             'colour': self.colour,
@@ -113,8 +146,32 @@ class Player:
             'money': self.money,
             'ready': self.is_ready(),
         }
+        self.json_cache = player
+        return player
+
+    def snapshot(self):
+        """ Returns a json dict with the state needed to restore the
+        player.
+        """
+        player = dict(self.to_json())
+        player['status'] = self.status
+        player['token'] = self.token
         return player
 
+    def restore(self, player):
+        """ Restores the state of a player snapshot. The UID is interned,
+        see `Game.restore`.
+        """
+        self.UID = sys.intern(player['uid'])
+        self.token = player['token']
+        self.name = player['name']
+        self.colour = player['colour']
+        self.gender = player['gender']
+        self.position = player['position']
+        self.money = player['money']
+        self.status = player['status']
+        self.json_cache = None
+
     def update_player_attribute(self, attribute, value):
         """ Updates a personal player attribute. Only attributes inside
         UPDATABLE_ATTRIBUTES are allowed to be updated by this function.
@@ -131,6 +188,7 @@ class Player:
             return False
 
         setattr(self, attribute, value)
+        self.changed()
         return True
 
     def is_ready(self):
@@ -146,19 +204,28 @@ class Player:
         return self.status == self.PLAYER_BANKRUPT
 
     def set_ready(self):
-        """ Changes the player status to ready.
+        """ Changes the player status to ready. Players not seated in the
+        game, e.g. the ones left from a finished game, are ignored.
         """
         if self.game.has_started() or self.status == self.PLAYER_READY:
             return
+        if self not in self.game.players:
+            return
         self.status = self.PLAYER_READY
+        self.changed()
         self.game.player_is_ready()
 
     def set_not_ready(self):
-        """ Changes the player status to not ready.
+        """ Changes the player status to not ready. Players not seated in
+        the game are ignored.
         """
         if self.game.has_started() or self.status == self.PLAYER_NOT_READY:
             return
+        if self not in self.game.players:
+            return
         self.status = self.PLAYER_NOT_READY
+        self.changed()
+        self.game.player_not_ready()
 
     def set_awaiting_turn(self):
         """ Changes the player status to awaiting turn.
@@ -189,44 +256,36 @@ class Player:
     def roll_dices(self):
         """ Rolls dices. Generates two random numbers from 1-6.
         """
-        dice1 = random.randint(1, 6)
-        dice2 = random.randint(1, 6)
+        dice1 = self.game.rng.randint(1, 6)
+        dice2 = self.game.rng.randint(1, 6)
 
         self.client.send_player_end_dices()
         self.game.player_rolled_dices([dice1, dice2])
-        asyncio.ensure_future(self.move(dice1 + dice2))
+        self.move(dice1 + dice2)
 
-    async def move(self, movement):
+    def move(self, movement):
         """ Moves the player from current position to `position + movement`
-        position.
+        position. The whole path is resolved at once and sent to the
+        clients to be animated.
         """
-        next_position = self.position
-        self.position = (next_position + movement) % self.game.positions
-        self.game.player_moved(self)
-
-        box = None
-        for mov in range(movement):
-            next_position += 1
-            if next_position == self.game.positions:
-                next_position = 0
-
-            box = self.game.board.get_box(next_position)
-            await self.move_position(box)
-
-        box.goes_in(self)
-
-    async def move_position(self, box):
-        try:
-            await asyncio.sleep(0.5)
-            box.goes_throught(self)
-        except asyncio.CancelledError:
-            return
+        step_duration = STEP_DURATION * self.game.scheduler.clock.time_scale
+        movement = Movement(
+            self.position,
+            movement,
+            self.game.positions,
+            step_duration,
+        )
+        self.position = movement.end
+        self.changed()
+        self.game.player_moved(self, movement)
+        movement.resolve(self, self.game.board)
 
     def add_money(self, money):
         """ Add the money value to the current money, can be negative
         value.
         """
         self.money += money
+        self.changed()
         if self.money < 0:
             self.set_bankrupt()
         self.game.player_money(self, money)
@@ -2,74 +2,261 @@
 Module: protocol
 """
 from autobahn.asyncio.websocket import WebSocketServerProtocol
-from moneygather.server.log import logger
+from moneygather.server.codec import DEFAULT_CODEC
+from moneygather.server.codec import negotiate_codec
+from moneygather.server.config import ACTION_RATE_LIMITS
+from moneygather.server.config import MAX_ATTRIBUTE_LENGTH
+from moneygather.server.config import MAX_CHAT_LENGTH
+from moneygather.server.config import MAX_NAME_LENGTH
+from moneygather.server.config import OUTBOX_LIMIT
+from moneygather.server.config import RATE_LIMIT
+from moneygather.server.config import SLOW_CONSUMER_TIMEOUT
+from moneygather.server.config import WRITE_BUFFER_HIGH
+from moneygather.server.config import WRITE_BUFFER_LOW
+from moneygather.server.log import get_logger
 from moneygather.server.log import log_exceptions
+from moneygather.server.metrics import decode_seconds
+from moneygather.server.metrics import dispatch_seconds
+from moneygather.server.outbox import coalesce_key
+from moneygather.server.outbox import Outbox
+from moneygather.server.player import Player
+from moneygather.server.ratelimit import RateLimiter
+from moneygather.server.schema import Field
+from moneygather.server.schema import validate
+from moneygather.server.sync import StateSync
 from moneygather.server.utils import remove_html_tags
 
-import json
+import asyncio
+import logging
+import time
+
+
+logger = get_logger('protocol')
+
+LOG_METHODS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+}
+
+# Handler, schema of the message fields and check of the workflow state by
+# action, filled by `action`
+ACTIONS = dict()
+
+
+def action(name, schema=None, allowed=None):
+    """ Registers the decorated method as the handler of an action. The
+    schema is a dict of Field by field name, validated before the handler
+    is called. `allowed` returns False if the client cannot perform the
+    action in the current workflow state, None to always allow it.
+    """
+    def register(method):
+        ACTIONS[name] = (method, schema or dict(), allowed)
+        return method
+    return register
+
+
+def can_roll_dices(client):
+    """ Returns True if the player of the client has to roll the dices.
+    """
+    return client.room.game.can_roll_dices(client.player)
 
 
 class Protocol(WebSocketServerProtocol):
 
+    room = None
+    room_id = None
+    player = None
+    resume_token = None
+    board_version = None
+    codec = DEFAULT_CODEC
+    sync_mode = StateSync.FULL
+    requested_sync_mode = StateSync.FULL
+    outbox = None
+    writing_paused = False
+    evict_timer = None
+    rate_limiter = None
+
     @log_exceptions
     def onConnect(self, request):
-        """ Connected client hook.
+        """ Connected client hook. Reads the room, the token of the player
+        to resume, the sync mode requested by the client and the version of
+        the board it already has from the `room`, `token`, `sync` and
+        `board` query parameters, if any, and negotiates the wire format
+        from the offered subprotocols.
         """
         self.logger('info', 'Connecting')
+        room_id = request.params.get('room')
+        if room_id:
+            self.room_id = room_id[0]
+        resume_token = request.params.get('token')
+        if resume_token:
+            self.resume_token = resume_token[0]
+        sync_mode = request.params.get('sync')
+        if sync_mode and sync_mode[0] in StateSync.MODES:
+            self.requested_sync_mode = sync_mode[0]
+        board_version = request.params.get('board')
+        if board_version:
+            self.board_version = board_version[0]
+
+        codec = negotiate_codec(request.protocols)
+        if codec is not None:
+            self.codec = codec
+            return codec.subprotocol
 
     @log_exceptions
     def onOpen(self):
-        """ Opened client hook. Registers the client.
+        """ Opened client hook. Sets the write buffer watermarks of the
+        transport and the inbound rate limits and registers the client.
         """
         self.logger('info', 'Opened')
+        self.rate_limiter = RateLimiter(RATE_LIMIT, ACTION_RATE_LIMITS)
+        self.transport.set_write_buffer_limits(
+            high=WRITE_BUFFER_HIGH,
+            low=WRITE_BUFFER_LOW,
+        )
         self.factory.register_client(self)
 
     @log_exceptions
     def onClose(self, wasClean, code, reason):
         """ Closed client hook. Unregisters the client.
         """
-        self.logger('info', f'Closed: Code {code} Reason: {reason}')
+        self.logger('info', 'Closed: Code %s Reason: %s', code, reason)
+        if self.evict_timer is not None:
+            self.evict_timer.cancel()
+            self.evict_timer = None
         self.factory.unregister_client(self)
 
+    def pause_writing(self):
+        """ Transport hook, its buffer went over the high watermark. The
+        frames are held in the outbox until it drains, the client is
+        evicted if it does not within SLOW_CONSUMER_TIMEOUT seconds.
+        """
+        self.writing_paused = True
+        if self.outbox is None:
+            self.outbox = Outbox()
+        loop = asyncio.get_running_loop()
+        self.evict_timer = loop.call_later(
+            SLOW_CONSUMER_TIMEOUT,
+            self.evict,
+            'Write buffer full for too long',
+        )
+
+    def resume_writing(self):
+        """ Transport hook, its buffer went below the low watermark. Sends
+        the frames held meanwhile.
+        """
+        self.writing_paused = False
+        if self.evict_timer is not None:
+            self.evict_timer.cancel()
+            self.evict_timer = None
+        while self.outbox and not self.writing_paused:
+            self.sendPreparedMessage(self.outbox.pop())
+
+    def evict(self, reason):
+        """ Drops the connection of a client that does not read its
+        messages. Its seat is held as for any other disconnection.
+        """
+        self.logger('warning', 'Evicted: %s', reason)
+        self.evict_timer = None
+        self.factory.evictions += 1
+        self.outbox.clear()
+        self.dropConnection(abort=True)
+
     @log_exceptions
     def onMessage(self, payload, isBinary):
-        """ Message from client hook. Process the message.
+        """ Message from client hook. Process the message. Messages over
+        the rate limit of the connection are dropped before decoding.
         """
+        if self.room is None:
+            return
+
+        if not self.rate_limiter.allow_message():
+            self.factory.message_dropped(None)
+            return
+
+        codec = self.codec
+        if isBinary != codec.binary:
+            codec = DEFAULT_CODEC
+
         try:
-            self.logger('info', 'Socket message')
-            payload = json.loads(payload.decode('utf8'))
+            self.logger('debug', 'Socket message')
+            started = time.perf_counter()
+            payload = codec.decode(payload)
+            decode_seconds.observe(time.perf_counter() - started)
         except ValueError:
             response = {
                 'action': 'ERROR',
-                'reason': 'The message must be JSON',
+                'reason': f'The message must be {codec.name}',
             }
             self.logger('warning', 'Socket message error')
             self.send_message(response)
         else:
+            if not isinstance(payload, dict):
+                self.invalid_message(None, None, 'must be an object')
+                return
+            if not isinstance(payload.get('action', ''), str):
+                self.invalid_message(None, 'action', 'must be str')
+                return
             self.process_message(payload)
 
-    def logger(self, method, message):
-        """ Helper function to log including client peer info.
+    def logger(self, method, message, *args):
+        """ Helper function to log including client peer info. The message
+        is only formatted if the level is enabled.
         """
-        pre_message = f'CLIENT: {self.peer} ==>'
-
-        if method == 'info':
-            logger.info(f'{pre_message} {message}')
-        if method == 'warning':
-            logger.warning(f'{pre_message} {message}')
+        level = LOG_METHODS[method]
+        if logger.isEnabledFor(level):
+            logger.log(level, 'CLIENT: %s ==> ' + message, self.peer, *args)
 
     def process_message(self, payload):
-        """ Reads the message action and calls the proper handler.
+        """ Reads the message action, validates the message against the
+        schema of the action and calls the proper handler.
         """
-        switcher = {
-            'MESSAGE': self.chat_message_action,
-            'PLAYER_STATUS': self.player_status_action,
-            'PLAYER_UPDATED': self.player_updated_action,
-            'ROLL_DICES': self.roll_dices_action,
-        }
         action = payload.get('action', False)
-        action_method = switcher.get(action, self.default_action)
-        action_method(payload)
+        if not self.rate_limiter.allow_action(action):
+            self.rate_limited_action(action)
+            return
+
+        started = time.perf_counter()
+        handler = ACTIONS.get(action)
+        if handler is None:
+            self.default_action(payload)
+            action = 'UNKNOWN'
+        else:
+            action_method, schema, allowed = handler
+            error = validate(schema, payload)
+            if error is not None:
+                self.invalid_message(action, *error)
+            elif allowed is not None and not allowed(self):
+                self.not_allowed_action(action)
+            else:
+                action_method(self, payload)
+        dispatch_seconds.labels(action).observe(time.perf_counter() - started)
+
+    def rate_limited_action(self, action):
+        """ Handler of the messages over the rate limit of their action.
+        """
+        self.logger('debug', 'Rate limited %s', action)
+        self.factory.message_dropped(action)
+        response = {
+            'action': 'ERROR',
+            'reason': 'Rate limit exceeded',
+        }
+        self.send_message(response)
+
+    def invalid_message(self, action, field, error):
+        """ Handler of the messages not matching the schema of their
+        action.
+        """
+        self.logger('warning', 'Invalid %s: %s %s', action, field, error)
+        response = {
+            'action': 'ERROR',
+            'reason': 'Invalid message',
+            'request': action,
+            'field': field,
+            'error': error,
+        }
+        self.send_message(response)
 
     def default_action(self, payload):
         """ Default action handler when the message received by the client
@@ -86,13 +273,14 @@ class Protocol(WebSocketServerProtocol):
         """ Action handler when the client tries to perform an action it
         is not allowed in the current workflow state.
         """
-        self.logger('warning', f'Not allowed action: {action}')
+        self.logger('warning', 'Not allowed action: %s', action)
         response = {
             'action': 'NOT ALLOWED',
             'reason': 'Action not allowed',
         }
         self.send_message(response)
 
+    @action('MESSAGE', {'message': Field(str, max_length=MAX_CHAT_LENGTH)})
     def chat_message_action(self, payload):
         """ Action handler when received a chat message.
         """
@@ -104,24 +292,34 @@ class Protocol(WebSocketServerProtocol):
         message = remove_html_tags(message)
         self.send_chat_message(message)
 
+    @action('PLAYER_STATUS', {'status': Field(str)})
     def player_status_action(self, payload):
         """ Action handler when player changes its status.
         """
-        self.logger('info', f'Changed status to: {payload["status"]}')
+        self.logger('info', 'Changed status to: %s', payload['status'])
         if payload['status'] == 'ready':
-            self.factory.send_game_event(
+            self.room.send_game_event(
                 'PLAYER_READY',
                 self.player.to_json(),
             )
             self.player.set_ready()
         else:
-            self.factory.send_game_event(
+            self.room.send_game_event(
                 'PLAYER_NOT_READY',
                 self.player.to_json(),
             )
             self.player.set_not_ready()
-        self.factory.send_player_list()
+        self.room.send_player_list()
 
+    @action('PLAYER_UPDATED', {
+        'name': Field(str, max_length=MAX_NAME_LENGTH),
+        'colour': Field(str, max_length=MAX_ATTRIBUTE_LENGTH),
+        'gender': Field(
+            str,
+            choices=Player.GENDERS,
+            max_length=MAX_ATTRIBUTE_LENGTH,
+        ),
+    })
     def player_updated_action(self, payload):
         """ Action handler when player updates their attributes.
         """
@@ -148,9 +346,10 @@ class Protocol(WebSocketServerProtocol):
             'previous_gender': previous_gender,
         }
 
-        self.factory.send_game_event('PLAYER_UPDATED', player_updated_info)
-        self.factory.send_player_list()
+        self.room.send_game_event('PLAYER_UPDATED', player_updated_info)
+        self.room.send_player_list()
 
+    @action('ROLL_DICES', allowed=can_roll_dices)
     def roll_dices_action(self, payload):
         """ Action handler when the player rolls the dices.
         """
@@ -158,24 +357,88 @@ class Protocol(WebSocketServerProtocol):
         self.player.roll_dices()
         # self.factory.next_turn()
 
+    @action('SYNC_MODE', {'mode': Field(str, choices=StateSync.MODES)})
+    def sync_mode_action(self, payload):
+        """ Action handler when the player changes how the state is
+        synchronized: full messages or deltas.
+        """
+        sync_mode = payload['mode']
+        self.logger('info', 'Sync mode: %s', sync_mode)
+        self.room.set_sync_mode(self, sync_mode)
+
+    @action('STATE_SNAPSHOT')
+    def state_snapshot_action(self, payload):
+        """ Action handler when the player requests a state snapshot.
+        """
+        self.logger('info', 'State snapshot')
+        if self.sync_mode != StateSync.DELTA:
+            self.not_allowed_action('STATE_SNAPSHOT')
+            return
+        self.room.send_state_snapshot(self)
+
     def send_message(self, message):
-        """ Encodes the messages and sends to the client.
+        """ Encodes the messages and sends to the client. Nothing is sent
+        once the connection is closing, e.g. to a player leaving its turn.
+        """
+        if self.state != self.STATE_OPEN:
+            return
+        payload = self.codec.encode(message)
+        if self.writing_paused:
+            frame = self.factory.prepareMessage(
+                payload,
+                isBinary=self.codec.binary,
+            )
+            self.send_prepared(frame, coalesce_key(message))
+            return
+        self.sendMessage(payload, isBinary=self.codec.binary)
+
+    def send_prepared(self, frame, key=None):
+        """ Sends a prepared frame. While the transport is paused the frame
+        is held in the outbox, replacing the held one with the same
+        coalescing `key`.
         """
-        message = json.dumps(message).encode('utf-8')
-        self.sendMessage(message)
+        if self.state != self.STATE_OPEN:
+            return
+        if not self.writing_paused:
+            self.sendPreparedMessage(frame)
+            return
+        self.outbox.put(frame, key)
+        if len(self.outbox) > OUTBOX_LIMIT:
+            self.evict('Outbox full')
 
     def send_client_info(self):
-        """ Sends to client initial information about the player.
+        """ Sends to client initial information about the player. The room
+        and the token let the client resume the player if disconnected.
         """
         response = {
             'action': 'PLAYER_INFO',
+            'room': self.room.room_id,
             'uid': self.player.UID,
+            'token': self.player.token,
             'name': self.player.name,
             'colour': self.player.colour,
             'gender': self.player.gender,
         }
         self.send_message(response)
 
+    def send_matchmaking_status(self, queue_depth):
+        """ Sends to client that it is waiting for a game.
+        """
+        response = {
+            'action': 'MATCHMAKING',
+            'queue_depth': queue_depth,
+        }
+        self.send_message(response)
+
+    def send_redirect(self, port):
+        """ Sends to client the port of the worker serving its room.
+        """
+        response = {
+            'action': 'REDIRECT',
+            'port': port,
+        }
+        self.send_message(response)
+
     def send_chat_message(self, message):
         """ Sends to clients a chat message.
         """
@@ -186,7 +449,7 @@ class Protocol(WebSocketServerProtocol):
             'colour': self.player.colour,
             'gender': self.player.gender,
         }
-        self.factory.broadcast(response)
+        self.room.broadcast(response)
 
     def send_player_turn(self, turn_duration):
         """ Sends the player when it is his turn.
@@ -0,0 +1,80 @@
+"""
+Module: ratelimit
+"""
+import time
+
+
+class TokenBucket:
+    """ A class to limit the rate of an event. The bucket holds up to
+    `burst` tokens and refills `rate` tokens per second, every event takes
+    one.
+
+    Attributes
+    ----------
+    rate : float
+        Tokens added per second
+    burst : float
+        Maximum number of tokens
+    tokens : float
+        Tokens available
+    updated : float
+        Time of the last refill
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def consume(self):
+        """ Takes a token. Returns False if the bucket is empty.
+        """
+        now = time.monotonic()
+        tokens = self.tokens + (now - self.updated) * self.rate
+        self.tokens = min(tokens, self.burst)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RateLimiter:
+    """ A class to limit the messages of a connection, as a whole and per
+    action. The buckets of the actions are created on their first message.
+
+    Attributes
+    ----------
+    bucket : TokenBucket
+        Bucket of all the messages, None if not limited
+    action_limits : dict<str, tuple>
+        Rate and burst by limited action
+    buckets : dict<str, TokenBucket>
+        Buckets of the limited actions
+    """
+
+    def __init__(self, limit=None, action_limits=None):
+        self.bucket = None
+        if limit is not None:
+            self.bucket = TokenBucket(*limit)
+        self.action_limits = action_limits or dict()
+        self.buckets = dict()
+
+    def allow_message(self):
+        """ Returns False if the connection sends messages too fast.
+        """
+        if self.bucket is None:
+            return True
+        return self.bucket.consume()
+
+    def allow_action(self, action):
+        """ Returns False if the action is sent too fast.
+        """
+        bucket = self.buckets.get(action)
+        if bucket is None:
+            limit = self.action_limits.get(action)
+            if limit is None:
+                return True
+            bucket = self.buckets[action] = TokenBucket(*limit)
+        return bucket.consume()
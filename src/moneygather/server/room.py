@@ -0,0 +1,489 @@
+"""
+Module: room
+"""
+from moneygather.server.codec import EncodedMessage
+from moneygather.server.exceptions import GameAlreadyStarted
+from moneygather.server.exceptions import GameIsFull
+from moneygather.server.game import Game
+from moneygather.server.log import get_logger
+from moneygather.server.metrics import broadcast_clients
+from moneygather.server.player import Player
+from moneygather.server.sync import StateSync
+from moneygather.server.utils import number_to_string
+
+
+logger = get_logger('room')
+
+
+class DetachedClient:
+    """ Client without socket, of a restored player until it reconnects
+    and of the players of a simulated game. Nothing is sent.
+    """
+
+    def send_client_info(self):
+        pass
+
+    def send_player_turn(self, turn_duration):
+        pass
+
+    def send_player_end_dices(self):
+        pass
+
+
+class Room:
+    """ A class to encapsulate a game and the clients playing it.
+
+    Attributes
+    ----------
+    room_id : str
+        Room identifier
+    factory : Factory
+        Factory reference
+    clients : list<Protocol>
+        List of clients registered in the room
+    game : Game
+        Game played in the room
+    player_list_version : int
+        Version of the player list, increased when it changes
+    player_list_message : PreparedMessage
+        Prepared PLAYER_LIST frame of the current version, if built
+    sync : StateSync
+        State known by the clients synchronizing through deltas
+    num_delta_clients : int
+        Number of clients synchronizing through deltas
+    detached : dict<str, tuple>
+        Held seats, player and timer releasing the seat, by resume token
+    paused : bool
+        True for a restored game waiting for its players
+    """
+
+    def __init__(
+        self,
+        room_id,
+        factory,
+        num_players=2,
+        scheduler=None,
+        rng=None,
+        board=None,
+    ):
+        self.room_id = room_id
+        self.factory = factory
+        self.clients = []
+        self.player_list_version = 0
+        self.player_list_message = None
+        self.sync = StateSync()
+        self.num_delta_clients = 0
+        self.detached = dict()
+        self.paused = False
+        self.game = Game(
+            self,
+            num_players=num_players,
+            scheduler=scheduler,
+            rng=rng,
+            board=board,
+        )
+
+    def is_joinable(self):
+        """ Returns True if the room accepts new players.
+        """
+        if self.game.has_started():
+            return False
+        return len(self.game.players) < self.game.num_players
+
+    def is_empty(self):
+        """ Returns True if there are no clients in the room nor players
+        waiting for their client.
+        """
+        return not self.clients and not self.detached
+
+    def register_client(self, client):
+        """ Generates a new player for the client and adds it to the game.
+
+        If no exceptions adds the client to the list of clients.
+        If there are exceptions closes the websocket connection.
+        Clients resuming with the token of a held seat take it back instead.
+        """
+        if client.resume_token in self.detached:
+            return self.reattach_client(client)
+
+        player = Player(client, self.game)
+
+        try:
+            self.game.add_player(player)
+        except GameAlreadyStarted:
+            client.sendClose(code=3000, reason='Game already started')
+            return False
+        except GameIsFull:
+            client.sendClose(code=3001, reason='Max players reached')
+            return False
+
+        logger.info('ROOM %s ==> Player joined', self.room_id)
+        client.room = self
+        client.player = player
+        client.send_client_info()
+        self.clients.append(client)
+        self.player_list_changed()
+        self.set_sync_mode(client, client.requested_sync_mode)
+        self.send_game_event('PLAYER_CONNECTED', client.player.to_json())
+        self.send_player_list()
+        return True
+
+    def reattach_client(self, client):
+        """ Gives a held seat back to its client. The client catches up
+        through GAME_STARTED and the player list, or a snapshot in delta
+        mode, the others only get the connection event as the player list
+        did not change. A restored game resumes once every player is back.
+        """
+        player, timer = self.detached.pop(client.resume_token)
+        timer.cancel()
+
+        logger.info('ROOM %s ==> Player resumed', self.room_id)
+        player.client = client
+        client.room = self
+        client.player = player
+        client.send_client_info()
+        self.clients.append(client)
+        self.set_sync_mode(client, client.requested_sync_mode)
+        if client.sync_mode == StateSync.FULL:
+            self.send_board(client)
+            response = self.game_started_response()
+            response['player_list'] = self.get_player_list()
+            client.send_message(response)
+        self.send_game_event('PLAYER_CONNECTED', player.to_json())
+
+        if self.paused and not self.detached:
+            self.paused = False
+            self.game.resume()
+        return True
+
+    def unregister_client(self, client):
+        """ Removes player from the game and client from the list of clients.
+        The seat of a player of a running game is held instead, see
+        `detach_player`. Returns True if the client belonged to the room.
+        """
+        try:
+            self.clients.remove(client)
+        except ValueError:
+            return False
+
+        logger.info('ROOM %s ==> Player left', self.room_id)
+        if client.sync_mode == StateSync.DELTA:
+            self.num_delta_clients -= 1
+        self.send_game_event(
+            'PLAYER_DISCONNECTED',
+            client.player.to_json(),
+        )
+
+        player = client.player
+        running = self.game.has_started() and not self.game.has_finished()
+        if running and not player.is_bankrupted():
+            self.detach_player(player, self.factory.resume_grace)
+            return True
+
+        self.game.remove_player(player)
+        self.player_list_changed()
+        self.send_player_list()
+        return True
+
+    def detach_player(self, player, grace):
+        """ Holds the seat of a player without client for `grace` seconds.
+        The turns go on meanwhile. The player goes bankrupt if nobody
+        resumes it with its token in time.
+        """
+        player.client = DetachedClient()
+        timer = self.game.scheduler.call_later(
+            grace,
+            self.seat_expired,
+            player.token,
+        )
+        self.detached[player.token] = (player, timer)
+
+    def seat_expired(self, token):
+        """ Releases a held seat, the player goes bankrupt.
+        """
+        player, _ = self.detached.pop(token)
+        logger.info('ROOM %s ==> Seat released', self.room_id)
+        if self.paused:
+            self.paused = False
+            self.game.resume()
+        self.game.remove_player(player)
+        self.factory.update_room(self)
+
+    def release_seats(self):
+        """ Cancels the timers of the held seats.
+        """
+        for _, timer in self.detached.values():
+            timer.cancel()
+        self.detached.clear()
+
+    def close_clients(self, code, reason):
+        """ Closes the connection of every client in the room. The clients
+        are unregistered as their connections close.
+        """
+        for client in list(self.clients):
+            client.sendClose(code=code, reason=reason)
+
+    def restore(self, game, grace):
+        """ Restores a game snapshot. Its seats are held `grace` seconds
+        and the game is paused until every player is back or a seat is
+        released.
+        """
+        players = []
+        for data in game['players']:
+            player = Player(DetachedClient(), self.game, random=False)
+            player.restore(data)
+            players.append(player)
+        self.game.restore(game, players)
+        for player in players:
+            if not player.is_bankrupted():
+                self.detach_player(player, grace)
+        self.paused = True
+
+    def prepare_message(self, response):
+        """ Returns the message to be encoded once per codec in use
+        """
+        return EncodedMessage(self.factory, response)
+
+    def broadcast(self, response):
+        """ Encodes and sends the message to all clients of the room
+        """
+        self.broadcast_prepared(self.prepare_message(response))
+
+    def broadcast_prepared(self, message, sync_mode=None):
+        """ Sends an already prepared message to all clients of the room,
+        or only to the ones using the given sync mode.
+        """
+        sent = 0
+        for client in self.clients:
+            if sync_mode and client.sync_mode != sync_mode:
+                continue
+            client.send_prepared(message.get(client.codec), message.key)
+            sent += 1
+        broadcast_clients.observe(sent)
+
+    def broadcast_full(self, response):
+        """ Encodes and sends a full state message to the clients not
+        synchronizing through deltas.
+        """
+        if self.num_delta_clients == len(self.clients):
+            return
+        message = self.prepare_message(response)
+        self.broadcast_prepared(message, StateSync.FULL)
+
+    def set_sync_mode(self, client, sync_mode):
+        """ Changes the sync mode of a client of the room. Clients switching
+        to deltas receive a snapshot to start from.
+        """
+        if client.sync_mode == sync_mode:
+            return
+
+        if sync_mode == StateSync.FULL:
+            client.sync_mode = sync_mode
+            self.num_delta_clients -= 1
+            return
+
+        players = self.get_players()
+        if self.num_delta_clients:
+            self.send_state_delta(players, complete=True)
+        else:
+            self.sync.reset(players)
+        client.sync_mode = sync_mode
+        self.num_delta_clients += 1
+        self.send_board(client)
+        client.send_message(self.sync.snapshot(self.game))
+
+    def send_state_delta(self, players, complete=False):
+        """ Sends the changes of the players to the clients synchronizing
+        through deltas.
+        """
+        if not self.num_delta_clients:
+            return
+        changes = self.sync.diff(players, complete)
+        if not changes:
+            return
+        message = self.prepare_message(self.sync.delta(changes))
+        self.broadcast_prepared(message, StateSync.DELTA)
+
+    def send_state_snapshot(self, client):
+        """ Sends a full snapshot to a client synchronizing through deltas.
+        Pending changes are flushed first so the snapshot and the following
+        deltas share the sequence.
+        """
+        players = self.get_players()
+        if self.num_delta_clients:
+            self.send_state_delta(players, complete=True)
+        else:
+            self.sync.reset(players)
+        self.send_board(client)
+        client.send_message(self.sync.snapshot(self.game))
+
+    def player_changed(self, player):
+        """ Invoked by the game when a field of a player changes.
+        """
+        self.player_list_changed()
+        if self.factory.checkpointer is not None:
+            self.factory.checkpointer.player_changed(self, player)
+
+    def game_changed(self):
+        """ Invoked by the game when the turn passes.
+        """
+        if self.factory.checkpointer is not None:
+            self.factory.checkpointer.room_changed(self)
+
+    def player_list_changed(self):
+        """ Invalidates the cached PLAYER_LIST frame.
+        """
+        self.player_list_version += 1
+        self.player_list_message = None
+
+    def send_game_event(self, game_event, data):
+        """ Sends a game event message.
+        """
+        response = {
+            'action': 'GAME_EVENT',
+            'game_event': game_event,
+            'data': data,
+        }
+        self.broadcast(response)
+
+    def send_player_list(self):
+        """ Sends the player list. The frame is built once per version of
+        the player list and reused until a player changes.
+        """
+        self.send_state_delta(self.get_players(), complete=True)
+        if self.num_delta_clients == len(self.clients):
+            return
+
+        if self.player_list_message is None:
+            player_list = self.get_player_list()
+            response = {
+                'action': 'PLAYER_LIST',
+                'player_list': player_list,
+                'num_players': self.game.num_players
+            }
+            self.player_list_message = self.prepare_message(response)
+        self.broadcast_prepared(self.player_list_message, StateSync.FULL)
+
+    def send_dices_result(self, dices_result):
+        """ Sends dices result.
+        """
+        response = {
+            'action': 'DICES_RESULT',
+            'dice1': number_to_string(dices_result[0]),
+            'dice2': number_to_string(dices_result[1]),
+        }
+        self.broadcast(response)
+
+    def send_player_movement(self, player, movement):
+        """ Sends a player movement with the path to animate. Clients
+        synchronizing through deltas get the position in the delta and the
+        movement without it.
+        """
+        response = {
+            'action': 'PLAYER_MOVEMENT',
+            'uid': player.UID,
+        }
+        response.update(movement.to_json())
+        if self.num_delta_clients:
+            self.send_state_delta([player])
+            self.broadcast_prepared(
+                self.prepare_message(response),
+                StateSync.DELTA,
+            )
+        response['position'] = player.position
+        self.broadcast_full(response)
+
+    def send_player_money(self, player, money):
+        """ Sends a player money change.
+        """
+        response = {
+            'action': 'PLAYER_MONEY',
+            'variation': money,
+            'money': player.money,
+            'uid': player.UID,
+            'player': player.to_json(),
+        }
+        self.broadcast_full(response)
+        self.send_state_delta([player])
+
+    def send_player_bankrupt(self, player):
+        """ Sends a player bankrupt.
+        """
+        response = {
+            'action': 'PLAYER_BANKRUPT',
+            'uid': player.UID,
+        }
+        self.broadcast(response)
+        if self.factory.checkpointer is not None:
+            self.factory.checkpointer.player_changed(self, player)
+            self.factory.checkpointer.room_changed(self)
+
+    def send_player_winner(self, player):
+        """ Sends the winner player. While the server drains, the room is
+        closed once its game ends.
+        """
+        response = {
+            'action': 'PLAYER_WINNER',
+            'uid': player.UID,
+        }
+        self.broadcast(response)
+        if self.factory.draining:
+            self.factory.update_room(self)
+
+    def get_players(self):
+        """ Returns the players of the game, held seats included.
+        """
+        return self.game.players
+
+    def get_player_list(self):
+        """ Constructs the player list from the players of the game.
+        """
+        player_list = []
+        for player in self.game.players:
+            player_list.append(player.to_json())
+        return player_list
+
+    def start_game(self):
+        """ Starts the game. Clients synchronizing through deltas receive
+        the player changes as a delta instead of the player list.
+        """
+        for client in self.clients:
+            self.send_board(client)
+        response = self.game_started_response()
+        if self.num_delta_clients:
+            self.send_state_delta(self.get_players())
+            self.broadcast_prepared(
+                self.prepare_message(response),
+                StateSync.DELTA,
+            )
+        response['player_list'] = self.get_player_list()
+        self.broadcast_full(response)
+        self.factory.update_room(self)
+
+    def game_started_response(self):
+        """ Returns the GAME_STARTED message, without the player list.
+        """
+        board = self.game.board
+        return {
+            'action': 'GAME_STARTED',
+            'board_version': board.definition.version,
+            'owners': board.owned(),
+        }
+
+    def send_board(self, client):
+        """ Sends the layout of the board of a started game to a client not
+        knowing its version yet.
+        """
+        if not self.game.has_started():
+            return
+        definition = self.game.board.definition
+        if client.board_version == definition.version:
+            return
+        message = self.factory.board_message(definition)
+        client.send_prepared(message.get(client.codec), message.key)
+        client.board_version = definition.version
+
+    def next_turn(self):
+        """ Assigns next turn.
+        """
+        self.game.next_turn()
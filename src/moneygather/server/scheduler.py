@@ -0,0 +1,176 @@
+"""
+Module: scheduler
+"""
+from moneygather.server.clock import Clock
+from moneygather.server.config import TIME_SCALE
+from moneygather.server.log import handle_exception
+
+import heapq
+import itertools
+import math
+import sys
+
+
+class Timer:
+    """ A class to represent a deadline registered in the scheduler.
+
+    Attributes
+    ----------
+    scheduler : Scheduler
+        Scheduler reference
+    deadline : float
+        Clock time when the callback is run
+    callback : callable
+        Function to run, None once cancelled or run
+    args : tuple
+        Arguments of the callback
+    """
+
+    def __init__(self, scheduler, deadline, callback, args):
+        self.scheduler = scheduler
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+
+    def cancel(self):
+        """ Cancels the timer. Does nothing if it already run.
+        """
+        if self.callback is None:
+            return
+        self.callback = None
+        self.args = None
+        self.scheduler.timer_cancelled()
+
+    def cancelled(self):
+        """ Returns True if the timer was cancelled or already run.
+        """
+        return self.callback is None
+
+
+class Scheduler:
+    """ A class to run the timeouts of all games from a single heap.
+
+    Deadlines are rounded up to `resolution` so timers expiring close to
+    each other are run in a single loop wakeup, and cancelling a timer
+    only marks it, the heap is cleaned lazily.
+
+    Attributes
+    ----------
+    clock : Clock
+        Clock giving the time and running the wakeups
+    resolution : float
+        Granularity in game seconds of the wakeups
+    timers : list<tuple>
+        Heap of (deadline, sequence, Timer)
+    pending : int
+        Number of timers waiting to be run
+    cancelled : int
+        Number of cancelled timers still in the heap
+    wakeup : TimerHandle
+        Clock handle of the next wakeup
+    wakeup_at : float
+        Clock time of the next wakeup
+    """
+
+    COMPACT_THRESHOLD = 1024
+
+    def __init__(self, clock=None, resolution=0.1):
+        self.clock = clock or Clock()
+        self.resolution = resolution
+        self.timers = []
+        self.counter = itertools.count()
+        self.pending = 0
+        self.cancelled = 0
+        self.wakeup = None
+        self.wakeup_at = None
+
+    def time(self):
+        """ Returns the current clock time.
+        """
+        return self.clock.time()
+
+    def call_later(self, delay, callback, *args):
+        """ Runs the callback after `delay` game seconds. Returns a Timer
+        that can be cancelled.
+        """
+        deadline = self.time() + delay * self.clock.time_scale
+        timer = Timer(self, deadline, callback, args)
+        heapq.heappush(self.timers, (deadline, next(self.counter), timer))
+        self.pending += 1
+        self.schedule_wakeup()
+        return timer
+
+    def timer_cancelled(self):
+        """ Invoked by the timers when cancelled. Compacts the heap when
+        most of its entries are cancelled.
+        """
+        self.pending -= 1
+        self.cancelled += 1
+        if (self.cancelled > self.COMPACT_THRESHOLD
+                and self.cancelled > self.pending):
+            self.compact()
+
+    def compact(self):
+        """ Removes the cancelled timers from the heap.
+        """
+        self.timers = [
+            entry for entry in self.timers if not entry[2].cancelled()
+        ]
+        heapq.heapify(self.timers)
+        self.cancelled = 0
+
+    def schedule_wakeup(self):
+        """ Makes sure the loop wakes up for the earliest deadline.
+        """
+        while self.timers and self.timers[0][2].cancelled():
+            heapq.heappop(self.timers)
+            self.cancelled -= 1
+
+        if not self.timers:
+            self.cancel_wakeup()
+            return
+
+        resolution = self.resolution * self.clock.time_scale
+        deadline = math.ceil(self.timers[0][0] / resolution) * resolution
+        if self.wakeup is not None:
+            if self.wakeup_at <= deadline:
+                return
+            self.wakeup.cancel()
+
+        self.wakeup_at = deadline
+        self.wakeup = self.clock.call_at(deadline, self.tick)
+
+    def cancel_wakeup(self):
+        """ Cancels the next loop wakeup.
+        """
+        if self.wakeup is not None:
+            self.wakeup.cancel()
+            self.wakeup = None
+            self.wakeup_at = None
+
+    def tick(self):
+        """ Runs all the timers whose deadline is due.
+        """
+        now = max(self.time(), self.wakeup_at)
+        self.wakeup = None
+        self.wakeup_at = None
+
+        while self.timers and self.timers[0][0] <= now:
+            timer = heapq.heappop(self.timers)[2]
+            if timer.cancelled():
+                self.cancelled -= 1
+                continue
+
+            self.pending -= 1
+            callback, args = timer.callback, timer.args
+            timer.callback = None
+            timer.args = None
+            try:
+                callback(*args)
+            except Exception:
+                handle_exception(*sys.exc_info())
+
+        self.schedule_wakeup()
+
+
+scheduler = Scheduler(Clock(TIME_SCALE))
@@ -0,0 +1,64 @@
+"""
+Module: schema
+"""
+
+
+class Field:
+    """ A class to describe a field of a client message.
+
+    Attributes
+    ----------
+    type : type
+        Type of the value
+    required : bool
+        True if the message must contain the field
+    choices : tuple
+        Accepted values, None to accept any
+    max_length : int
+        Maximum length of a string value, None for no limit
+    minimum : int
+        Minimum of a number value, None for no limit
+    """
+
+    def __init__(
+        self,
+        type,
+        required=True,
+        choices=None,
+        max_length=None,
+        minimum=None,
+    ):
+        self.type = type
+        self.required = required
+        self.choices = choices
+        self.max_length = max_length
+        self.minimum = minimum
+
+    def validate(self, value):
+        """ Returns the error of the value, None if valid.
+        """
+        if type(value) is not self.type:
+            return f'must be {self.type.__name__}'
+        if self.choices is not None and value not in self.choices:
+            return 'must be one of ' + ', '.join(map(str, self.choices))
+        if self.max_length is not None and len(value) > self.max_length:
+            return f'must be at most {self.max_length} characters'
+        if self.minimum is not None and value < self.minimum:
+            return f'must be at least {self.minimum}'
+        return None
+
+
+def validate(schema, payload):
+    """ Validates the message fields against a schema, a dict of Field by
+    field name. Returns `(field, error)` for the first invalid field, None
+    if the message is valid.
+    """
+    for name, field in schema.items():
+        if name not in payload:
+            if field.required:
+                return name, 'is required'
+            continue
+        error = field.validate(payload[name])
+        if error is not None:
+            return name, error
+    return None
@@ -1,58 +1,234 @@
 """
 Module: server
 """
-from contextlib import suppress
-from moneygather.server.log import logger
+from moneygather.server.board import load_board
+from moneygather.server.config import BOARD_FILE
+from moneygather.server.config import CHECKPOINT_INTERVAL
+from moneygather.server.config import DRAIN_TIMEOUT
+from moneygather.server.config import EVENT_LOOP
+from moneygather.server.config import MAX_MESSAGE_SIZE
+from moneygather.server.config import METRICS_HOST
+from moneygather.server.config import METRICS_PORT
+from moneygather.server.config import RESTORE_GRACE
+from moneygather.server.config import RESUME_GRACE
+from moneygather.server.config import STORE_PATH
+from moneygather.server.config import WORKERS
+from moneygather.server.eventloop import install_loop
+from moneygather.server.exceptions import InvalidBoard
+from moneygather.server.log import get_logger
+from moneygather.server.metrics import LoopLagMonitor
+from moneygather.server.metrics import start_metrics_server
+from moneygather.server.metrics import watch_factory
 from moneygather.server.protocol import Protocol
 from moneygather.server.factory import Factory
+from moneygather.server.store import GameStore
+from moneygather.server.supervisor import Supervisor
 
 import asyncio
 import signal
 
 
+logger = get_logger('server')
+
+
+HOST = '0.0.0.0'
 PORT = 9000
 TRUST_X_FORWARDED_FOR = 1
+CLOSE_TIMEOUT = 5
 
 
-def process_signal(signal_number, frame):
-    raise SystemExit('Exiting')
+def worker_port(worker_id):
+    """ Returns the port only served by a worker, used to redirect clients
+    to the worker owning their room.
+    """
+    return PORT + 1 + worker_id
 
 
 def run_server():
-    logger.info('SERVER: Starting')
-    signal.signal(signal.SIGTERM, process_signal)
+    """ Runs the server, in a single process or in WORKERS processes
+    sharing the port. The board is loaded before starting the workers, so
+    an invalid board stops the server at once.
+    """
+    try:
+        load_board(BOARD_FILE)
+    except InvalidBoard as exception:
+        logger.error('SERVER: %s', exception)
+        return 1
+    if WORKERS > 1:
+        supervisor = Supervisor(
+            run_worker,
+            WORKERS,
+            HOST,
+            PORT,
+            shutdown_timeout=DRAIN_TIMEOUT + CLOSE_TIMEOUT + 5,
+        )
+        supervisor.run()
+        return 0
+    return run_worker()
+
+
+async def drain(factory, servers, timeout):
+    """ Stops accepting connections and waits up to `timeout` seconds for
+    the running games to end, held seats included. The clients left are
+    closed afterwards.
+    """
+    loop = asyncio.get_running_loop()
+    for server in servers:
+        server.close()
+    factory.drain()
+
+    deadline = loop.time() + timeout
+    progress = None
+    while loop.time() < deadline:
+        current = factory.drain_progress()
+        if not current['clients'] and not current['seats']:
+            break
+        if current != progress:
+            progress = current
+            logger.info(
+                'SERVER: Draining, %(games)s games, %(clients)s clients and '
+                '%(seats)s held seats left',
+                progress,
+            )
+        await asyncio.sleep(1)
+
+    if factory.num_clients:
+        logger.warning(
+            'SERVER: Drain timeout, closing %s clients',
+            factory.num_clients,
+        )
+        factory.close_all()
+        deadline = loop.time() + CLOSE_TIMEOUT
+        while factory.num_clients and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+    logger.info('SERVER: Drained')
+
+
+def run_worker(worker_id=0, workers=1, sock=None):
+    """ Runs the event loop of a server process. With several workers the
+    process listens on the shared port, through `sock` or SO_REUSEPORT,
+    and on its own worker port.
+    """
+    logger.info('SERVER: Starting worker %s', worker_id)
+    loop_name = install_loop(EVENT_LOOP)
+    logger.info('SERVER: Using the %s event loop', loop_name)
+    try:
+        return asyncio.run(serve(worker_id, workers, sock))
+    except KeyboardInterrupt:
+        logger.info('SERVER: Shutting down by KeyboardInterrupt')
+        return 0
+
 
-    factory = Factory()
+def create_factory(worker_id, workers):
+    """ Returns the factory of a worker, with the games of its store
+    restored.
+    """
+    store = None
+    if STORE_PATH:
+        store = GameStore(STORE_PATH)
+    factory = Factory(
+        worker_id=worker_id,
+        workers=workers,
+        worker_port=worker_port,
+        store=store,
+        checkpoint_interval=CHECKPOINT_INTERVAL,
+        resume_grace=RESUME_GRACE,
+        board=load_board(BOARD_FILE),
+    )
+    if store is not None:
+        factory.restore_rooms(RESTORE_GRACE)
     factory.protocol = Protocol
-    factory.setProtocolOptions(trustXForwardedFor=TRUST_X_FORWARDED_FOR)
+    factory.setProtocolOptions(
+        trustXForwardedFor=TRUST_X_FORWARDED_FOR,
+        maxFramePayloadSize=MAX_MESSAGE_SIZE,
+        maxMessagePayloadSize=MAX_MESSAGE_SIZE,
+    )
+    return factory
 
+
+async def start_servers(factory, workers, sock):
+    """ Returns the servers listening on the shared port and, with several
+    workers, on the worker port.
+    """
+    loop = asyncio.get_running_loop()
+    servers = []
     try:
-        loop = asyncio.get_event_loop()
-        coro = loop.create_server(factory, '0.0.0.0', PORT)
-        server = loop.run_until_complete(coro)
+        if sock is not None:
+            servers.append(await loop.create_server(factory, sock=sock))
+        else:
+            servers.append(await loop.create_server(
+                factory,
+                HOST,
+                PORT,
+                reuse_port=workers > 1,
+            ))
+        if workers > 1:
+            port = worker_port(factory.worker_id)
+            servers.append(await loop.create_server(factory, HOST, port))
+    except OSError:
+        for server in servers:
+            server.close()
+        raise
+    return servers
+
+
+async def serve(worker_id, workers, sock):
+    """ Serves the clients until SIGTERM and the drain of the running
+    games. The tasks left are cancelled by `asyncio.run`.
+    """
+    loop = asyncio.get_running_loop()
+    factory = create_factory(worker_id, workers)
+    try:
+        servers = await start_servers(factory, workers, sock)
     except OSError as exception:
         logger.error('SERVER: Could not start')
+        factory.close_store()
         if exception.errno == 98:
-            logger.error(f'SERVER: The port {PORT} is already in use')
+            logger.error('SERVER: The port %s is already in use', PORT)
             return 0
         else:
             raise exception
 
+    metrics_server = None
+    if METRICS_PORT:
+        watch_factory(factory)
+        port = METRICS_PORT + worker_id
+        try:
+            metrics_server = await start_metrics_server(METRICS_HOST, port)
+        except OSError:
+            logger.error('SERVER: Could not serve the metrics on %s', port)
+    loop_lag = LoopLagMonitor()
+    loop_lag.start()
+
+    stopped = loop.create_future()
+
+    def stop(*args):
+        if not stopped.done():
+            stopped.set_result(None)
+
+    def shutdown():
+        """ Drains the server on SIGTERM, a second one stops it at once.
+        """
+        if factory.draining:
+            logger.info('SERVER: Shutting down by second SIGTERM')
+            stop()
+            return
+        logger.info('SERVER: Shutting down by SIGTERM')
+        task = loop.create_task(drain(factory, servers, DRAIN_TIMEOUT))
+        task.add_done_callback(stop)
+
+    loop.add_signal_handler(signal.SIGTERM, shutdown)
+
     try:
         logger.info('SERVER: Running')
-        loop.run_forever()
-    except KeyboardInterrupt:
-        logger.info('SERVER: Shutting down by KeyboardInterrupt')
-    except SystemExit:
-        logger.info('SERVER: Shutting down by SystemExit')
+        await stopped
     finally:
-        logger.info('SERVER: Closing pending tasks')
-        pending_tasks = asyncio.all_tasks(loop=loop)
-        for task in pending_tasks:
-            task.cancel()
-            with suppress(asyncio.CancelledError):
-                loop.run_until_complete(task)
-
-        server.close()
-        loop.close()
+        loop.remove_signal_handler(signal.SIGTERM)
+        for server in servers:
+            server.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        loop_lag.stop()
+        factory.close_store()
         logger.info('SERVER: Closed')
+    return 0
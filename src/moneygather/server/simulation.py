@@ -0,0 +1,359 @@
+"""
+Module: simulation
+"""
+from moneygather.server.board import Board
+from moneygather.server.boxes import PaymentBox
+from moneygather.server.clock import VirtualClock
+from moneygather.server.game import Game
+from moneygather.server.log import logger
+from moneygather.server.player import Player
+from moneygather.server.room import DetachedClient
+from moneygather.server.scheduler import Scheduler
+
+import argparse
+import logging
+import random
+import statistics
+import time
+import tracemalloc
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class HeadlessRoom:
+    """ Replaces the room of a simulated game. Nothing is sent, it only
+    records how the game goes.
+
+    Attributes
+    ----------
+    turns : int
+        Number of turns played
+    winner : Player
+        Winner of the game, None while the game runs
+    finished : bool
+        True when the game ended
+    """
+
+    def __init__(self):
+        self.turns = 0
+        self.winner = None
+        self.finished = False
+
+    def start_game(self):
+        pass
+
+    def player_changed(self, player):
+        pass
+
+    def game_changed(self):
+        pass
+
+    def send_dices_result(self, dices_result):
+        self.turns += 1
+
+    def send_player_movement(self, player, movement):
+        pass
+
+    def send_player_money(self, player, money):
+        pass
+
+    def send_player_bankrupt(self, player):
+        pass
+
+    def send_player_winner(self, player):
+        self.winner = player
+        self.finished = True
+
+
+def simulate_game(num_players=2, money=1000, max_turns=500, rng=None):
+    """ Plays a whole game with the real Game, Board and Turn rules on a
+    virtual clock. Returns a dict with the number of turns, bankrupt
+    players and whether the game finished before `max_turns`.
+    """
+    clock = VirtualClock()
+    room = HeadlessRoom()
+    game = Game(
+        room,
+        num_players=num_players,
+        scheduler=Scheduler(clock),
+        rng=rng,
+    )
+    players = []
+    for _ in range(num_players):
+        player = Player(DetachedClient(), game, money=money, random=False)
+        game.add_player(player)
+        players.append(player)
+
+    for player in players:
+        player.set_ready()
+
+    clock.run(until=lambda: room.finished or room.turns >= max_turns)
+    game.turn.end_timeout_task()
+
+    result = {
+        'turns': room.turns,
+        'bankrupt': game.num_players_bankrupt(),
+        'finished': room.finished,
+    }
+    return result
+
+
+def summarize(lengths, bankrupt, finished, num_players):
+    """ Aggregates the results of many games into bankruptcy rate and game
+    length statistics.
+    """
+    games = len(lengths)
+    lengths = sorted(lengths)
+    summary = {
+        'games': games,
+        'finished_rate': sum(finished) / games,
+        'bankruptcy_rate': sum(bankrupt) / (games * num_players),
+        'length_mean': statistics.mean(lengths),
+        'length_p50': lengths[games // 2],
+        'length_p99': lengths[min(games - 1, int(games * 0.99))],
+        'length_max': lengths[-1],
+    }
+    return summary
+
+
+def run_simulations(
+    games,
+    num_players=2,
+    money=1000,
+    max_turns=500,
+    seed=None,
+):
+    """ Runs `games` headless games one after the other and summarizes
+    them.
+    """
+    rng = random.Random(seed)
+    lengths = []
+    bankrupt = []
+    finished = []
+    for _ in range(games):
+        result = simulate_game(num_players, money, max_turns, rng)
+        lengths.append(result['turns'])
+        bankrupt.append(result['bankrupt'])
+        finished.append(result['finished'])
+    return summarize(lengths, bankrupt, finished, num_players)
+
+
+def measure_memory(games, num_players=2, seed=None):
+    """ Returns the bytes allocated per idle game, its players waiting to
+    start, and per active game, started and with a turn running. Measured
+    with tracemalloc on headless games kept alive together.
+    """
+    rng = random.Random(seed)
+    scheduler = Scheduler(VirtualClock())
+    running = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(games):
+        game = Game(
+            HeadlessRoom(),
+            num_players=num_players,
+            scheduler=scheduler,
+            rng=rng,
+        )
+        for _ in range(num_players):
+            game.add_player(Player(DetachedClient(), game))
+        running.append(game)
+    idle = tracemalloc.get_traced_memory()[0]
+    for game in running:
+        for player in game.players:
+            player.set_ready()
+            player.to_json()
+    active = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    report = {
+        'games': games,
+        'idle_game_bytes': (idle - before) / games,
+        'active_game_bytes': (active - before) / games,
+    }
+    return report
+
+
+class BatchEngine:
+    """ Advances many games in lockstep as NumPy arrays of positions and
+    balances. Applies the same rules as the Game: two dices per turn, the
+    payment of every box the player goes throught, and a player goes
+    bankrupt when its money drops below zero. `landing_costs` adds a cost
+    per box when a player goes in, for balancing runs of rules not
+    implemented yet.
+
+    Attributes
+    ----------
+    positions : ndarray
+        Position of every player, games x players
+    money : ndarray
+        Money of every player, games x players
+    alive : ndarray
+        False for the bankrupt players, games x players
+    turn : ndarray
+        Index of the player that has the turn in every game
+    turns : ndarray
+        Number of turns played by every game
+    finished : ndarray
+        True for the games with a winner
+    """
+
+    def __init__(
+        self,
+        games,
+        num_players=2,
+        money=1000,
+        board=None,
+        landing_costs=None,
+        seed=None,
+    ):
+        if numpy is None:
+            raise ImportError('The batch engine requires numpy')
+
+        board = board or Board()
+        num_positions = len(board)
+        payments = numpy.zeros(num_positions, dtype=numpy.int64)
+        for position in range(num_positions):
+            box = board.get_box(position)
+            if isinstance(box, PaymentBox):
+                payments[position] = box.payment
+
+        # Cumulative payments over two laps so the payments of a path are
+        # a difference of two lookups
+        laps = numpy.concatenate([payments, payments])
+        self.cumulative = numpy.concatenate([[0], numpy.cumsum(laps)])
+        self.landing_costs = numpy.zeros(num_positions, dtype=numpy.int64)
+        if landing_costs is not None:
+            self.landing_costs[:] = landing_costs
+
+        self.num_positions = num_positions
+        self.num_players = num_players
+        self.rng = numpy.random.default_rng(seed)
+        self.games = numpy.arange(games)
+        self.positions = numpy.zeros((games, num_players), dtype=numpy.int64)
+        self.money = numpy.full((games, num_players), money, numpy.int64)
+        self.alive = numpy.ones((games, num_players), dtype=bool)
+        self.turn = numpy.zeros(games, dtype=numpy.int64)
+        self.turns = numpy.zeros(games, dtype=numpy.int64)
+        self.finished = numpy.zeros(games, dtype=bool)
+
+    def step(self):
+        """ Plays one turn in every running game.
+        """
+        games = self.games[~self.finished]
+        if not games.size:
+            return
+
+        current = self.turn[games]
+        dices = self.rng.integers(1, 7, size=(games.size, 2)).sum(axis=1)
+        start = self.positions[games, current]
+        end = (start + dices) % self.num_positions
+
+        gain = self.cumulative[start + dices + 1] - self.cumulative[start + 1]
+        money = self.money[games, current] + gain - self.landing_costs[end]
+        self.money[games, current] = money
+        self.positions[games, current] = end
+        self.alive[games, current] = money >= 0
+        self.turns[games] += 1
+
+        winners = self.alive[games].sum(axis=1) <= 1
+        self.finished[games[winners]] = True
+
+        # Next alive player, the current one when nobody else is alive
+        following = current
+        moved = numpy.zeros(games.size, dtype=bool)
+        for offset in range(1, self.num_players + 1):
+            candidate = (current + offset) % self.num_players
+            take = ~moved & self.alive[games, candidate]
+            following = numpy.where(take, candidate, following)
+            moved |= take
+        self.turn[games] = following
+
+    def run(self, max_turns=500):
+        """ Plays until every game finished or reached `max_turns`.
+        """
+        for _ in range(max_turns):
+            if self.finished.all():
+                break
+            self.step()
+
+    def summary(self):
+        """ Aggregates the results of the games.
+        """
+        bankrupt = (~self.alive).sum(axis=1)
+        return summarize(
+            self.turns.tolist(),
+            bankrupt.tolist(),
+            self.finished.tolist(),
+            self.num_players,
+        )
+
+
+def print_summary(summary, elapsed):
+    """ Prints a simulation summary.
+    """
+    print(f"Games:            {summary['games']}")
+    print(f"Games/sec:        {summary['games'] / elapsed:.1f}")
+    print(f"Finished rate:    {summary['finished_rate']:.3f}")
+    print(f"Bankruptcy rate:  {summary['bankruptcy_rate']:.3f}")
+    print(f"Length mean:      {summary['length_mean']:.1f} turns")
+    print(f"Length p50/p99:   {summary['length_p50']} / "
+          f"{summary['length_p99']} turns")
+    print(f"Length max:       {summary['length_max']} turns")
+
+
+def print_memory(report):
+    """ Prints a memory report.
+    """
+    print(f"Games:            {report['games']}")
+    print(f"Idle game:        {report['idle_game_bytes']:.0f} bytes")
+    print(f"Active game:      {report['active_game_bytes']:.0f} bytes")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Runs headless games to gather balance statistics.',
+    )
+    parser.add_argument('-g', '--games', type=int, default=1000)
+    parser.add_argument('-p', '--players', type=int, default=2)
+    parser.add_argument('-m', '--money', type=int, default=1000)
+    parser.add_argument('-t', '--max-turns', type=int, default=500)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument(
+        '--batch',
+        action='store_true',
+        help='Use the NumPy batch engine instead of the Game objects',
+    )
+    parser.add_argument(
+        '--memory',
+        action='store_true',
+        help='Report the memory of idle and active games instead',
+    )
+    args = parser.parse_args(argv)
+
+    logger.setLevel(logging.WARNING)
+    if args.memory:
+        print_memory(measure_memory(args.games, args.players, args.seed))
+        return
+    started = time.perf_counter()
+    if args.batch:
+        engine = BatchEngine(
+            args.games,
+            num_players=args.players,
+            money=args.money,
+            seed=args.seed,
+        )
+        engine.run(args.max_turns)
+        summary = engine.summary()
+    else:
+        summary = run_simulations(
+            args.games,
+            num_players=args.players,
+            money=args.money,
+            max_turns=args.max_turns,
+            seed=args.seed,
+        )
+    print_summary(summary, time.perf_counter() - started)
@@ -0,0 +1,270 @@
+"""
+Module: store
+"""
+from moneygather.server.log import get_logger
+from moneygather.server.scheduler import scheduler as default_scheduler
+
+import json
+import queue
+import sqlite3
+import threading
+
+
+logger = get_logger('store')
+
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS games (
+        room_id TEXT PRIMARY KEY,
+        data TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS players (
+        uid TEXT PRIMARY KEY,
+        room_id TEXT NOT NULL,
+        seat INTEGER NOT NULL,
+        data TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS players_room ON players (room_id)
+    ''',
+]
+
+
+class GameStore:
+    """ A class to keep the checkpoints of the games in a SQLite database.
+
+    Writes are queued and run by a thread with its own connection, so the
+    event loop only serializes the rows.
+
+    Attributes
+    ----------
+    path : str
+        Path of the database file
+    queue : SimpleQueue
+        Batches of rows waiting to be written
+    thread : Thread
+        Thread writing the batches, None if not started
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        connection = self.connect()
+        with connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+        connection.close()
+
+    def connect(self):
+        """ Returns a new connection to the database.
+        """
+        connection = sqlite3.connect(self.path)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def start(self):
+        """ Starts the thread writing the queued batches.
+        """
+        self.thread = threading.Thread(target=self.writer, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """ Writes the queued batches and stops the writer thread.
+        """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def write(self, games, players, removed):
+        """ Queues a batch of rows. `games` are `(room_id, data)` rows,
+        `players` are `(uid, room_id, seat, data)` rows and `removed` the
+        identifiers of the rooms to delete.
+        """
+        self.queue.put((games, players, removed))
+
+    def writer(self):
+        """ Writes the queued batches, one transaction per batch.
+        """
+        connection = self.connect()
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            games, players, removed = batch
+            try:
+                with connection:
+                    connection.executemany(
+                        'DELETE FROM games WHERE room_id = ?',
+                        [(room_id,) for room_id in removed],
+                    )
+                    connection.executemany(
+                        'DELETE FROM players WHERE room_id = ?',
+                        [(room_id,) for room_id in removed],
+                    )
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO games VALUES (?, ?)',
+                        games,
+                    )
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO players VALUES (?, ?, ?, ?)',
+                        players,
+                    )
+            except sqlite3.Error:
+                logger.exception('STORE ==> Could not write checkpoint')
+        connection.close()
+
+    def load(self):
+        """ Returns the saved games as dicts, with their players sorted by
+        seat in the `players` key.
+        """
+        connection = self.connect()
+        games = dict()
+        for room_id, data in connection.execute('SELECT * FROM games'):
+            game = json.loads(data)
+            game['room_id'] = room_id
+            game['players'] = []
+            games[room_id] = game
+
+        rows = connection.execute(
+            'SELECT room_id, data FROM players ORDER BY room_id, seat',
+        )
+        for room_id, data in rows:
+            game = games.get(room_id)
+            if game is not None:
+                game['players'].append(json.loads(data))
+        connection.close()
+        return list(games.values())
+
+
+class Checkpointer:
+    """ A class to write the state of the running games to the store.
+
+    Rooms and players are marked dirty as they change and written in
+    batches of at most `batch` rows every `interval` seconds, so a large
+    number of changes is spread over several ticks.
+
+    Attributes
+    ----------
+    store : GameStore
+        Store the checkpoints are written to
+    scheduler : Scheduler
+        Scheduler running the flushes
+    interval : float
+        Seconds between flushes
+    batch : int
+        Maximum number of rows per flush
+    rooms : dict<Room, None>
+        Rooms whose game row changed, in order
+    players : dict<Player, None>
+        Players whose row changed, in order
+    removed : set<str>
+        Identifiers of the rooms to delete
+    timer : Timer
+        Timer of the next flush, None if nothing is dirty
+    closed : bool
+        True once closed, changes are not recorded anymore
+    """
+
+    def __init__(self, store, scheduler=None, interval=1.0, batch=500):
+        self.store = store
+        self.scheduler = scheduler or default_scheduler
+        self.interval = interval
+        self.batch = batch
+        self.rooms = dict()
+        self.players = dict()
+        self.removed = set()
+        self.timer = None
+        self.closed = False
+        self.store.start()
+
+    def room_changed(self, room):
+        """ Marks the game row of a room as dirty. Only started games are
+        kept, a game back to its lobby is removed.
+        """
+        if self.closed:
+            return
+        if not room.game.has_started():
+            self.room_removed(room)
+            return
+        self.removed.discard(room.room_id)
+        self.rooms[room] = None
+        self.schedule_flush()
+
+    def player_changed(self, room, player):
+        """ Marks the row of a player as dirty.
+        """
+        if self.closed or not room.game.has_started():
+            return
+        self.players[player] = None
+        self.schedule_flush()
+
+    def room_removed(self, room):
+        """ Deletes the rows of a room.
+        """
+        if self.closed:
+            return
+        self.rooms.pop(room, None)
+        for player in room.game.players:
+            self.players.pop(player, None)
+        self.removed.add(room.room_id)
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        if self.timer is None:
+            self.timer = self.scheduler.call_later(self.interval, self.flush)
+
+    def flush(self, limit=None):
+        """ Writes up to `limit` dirty rows, `batch` by default, and
+        schedules the next flush if some are left.
+        """
+        self.timer = None
+        limit = limit or self.batch
+        removed = list(self.removed)
+        self.removed.clear()
+
+        games = []
+        while self.rooms and len(games) < limit:
+            room = next(iter(self.rooms))
+            del self.rooms[room]
+            games.append((room.room_id, json.dumps(room.game.snapshot())))
+
+        players = []
+        while self.players and len(games) + len(players) < limit:
+            player = next(iter(self.players))
+            del self.players[player]
+            room = player.game.server
+            try:
+                seat = room.game.players.index(player)
+            except ValueError:
+                continue
+            data = json.dumps(player.snapshot())
+            players.append((player.UID, room.room_id, seat, data))
+
+        if games or players or removed:
+            self.store.write(games, players, removed)
+            logger.debug(
+                'STORE ==> Checkpoint of %s games and %s players',
+                len(games),
+                len(players),
+            )
+        if self.rooms or self.players:
+            self.schedule_flush()
+
+    def close(self):
+        """ Writes every dirty row and stops recording changes.
+        """
+        if self.closed:
+            return
+        if self.timer is not None:
+            self.timer.cancel()
+        self.flush(limit=len(self.rooms) + len(self.players) + 1)
+        self.closed = True
+        self.store.close()
@@ -0,0 +1,175 @@
+"""
+Module: supervisor
+"""
+from contextlib import suppress
+from moneygather.server.log import get_logger
+from moneygather.server.log import stop_listener
+
+import os
+import signal
+import socket
+import time
+
+
+logger = get_logger('supervisor')
+
+
+def reuse_port_supported():
+    """ Returns True if the platform supports SO_REUSEPORT.
+    """
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        return False
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        with sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    except OSError:
+        return False
+    return True
+
+
+class Supervisor:
+    """ A class to fork and keep alive the worker processes of the server.
+
+    Every worker runs its own event loop. They share the port through
+    SO_REUSEPORT or, where it is not available, through a listening socket
+    created before forking.
+
+    Attributes
+    ----------
+    target : callable
+        Function run by the workers, `target(worker_id, workers, sock)`
+    workers : int
+        Number of workers
+    host : str
+        Address to listen on
+    port : int
+        Port shared by the workers
+    shutdown_timeout : float
+        Seconds the workers have to exit before being killed
+    pids : dict<int, int>
+        Worker identifier by process id
+    started : dict<int, float>
+        Last start time by worker identifier
+    stopping : bool
+        True once a shutdown signal was received
+    stopped_at : float
+        Time the shutdown signal was received
+    sock : socket
+        Listening socket shared by the workers, None with SO_REUSEPORT
+    """
+
+    RESTART_DELAY = 1
+
+    def __init__(self, target, workers, host, port, shutdown_timeout=30):
+        self.target = target
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.shutdown_timeout = shutdown_timeout
+        self.pids = dict()
+        self.started = dict()
+        self.stopping = False
+        self.stopped_at = None
+        self.sock = None
+
+    def listen(self):
+        """ Creates the listening socket shared by the workers when
+        SO_REUSEPORT is not available.
+        """
+        if reuse_port_supported():
+            logger.info('SUPERVISOR: Workers share the port by SO_REUSEPORT')
+            return
+
+        logger.info('SUPERVISOR: Workers share a listening socket')
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(socket.SOMAXCONN)
+        self.sock.setblocking(False)
+
+    def spawn(self, worker_id):
+        """ Forks a worker.
+        """
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            code = 0
+            try:
+                code = self.target(worker_id, self.workers, self.sock) or 0
+            except BaseException:
+                logger.exception('SUPERVISOR: Worker %s crashed', worker_id)
+                code = 1
+            finally:
+                stop_listener()
+                os._exit(code)
+
+        logger.info('SUPERVISOR: Worker %s started, pid %s', worker_id, pid)
+        self.pids[pid] = worker_id
+        self.started[worker_id] = time.monotonic()
+
+    def stop(self, signal_number, frame):
+        """ Signal handler, forwards the shutdown to the workers.
+        """
+        if self.stopping:
+            return
+        logger.info('SUPERVISOR: Stopping workers')
+        self.stopping = True
+        self.stopped_at = time.monotonic()
+        for pid in self.pids:
+            with suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
+    def reap(self):
+        """ Collects the exited workers and restarts them unless stopping.
+        """
+        while self.pids:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            worker_id = self.pids.pop(pid, None)
+            if worker_id is None or self.stopping:
+                continue
+
+            code = os.waitstatus_to_exitcode(status)
+            logger.error(
+                'SUPERVISOR: Worker %s exited with %s, restarting',
+                worker_id,
+                code,
+            )
+            if time.monotonic() - self.started[worker_id] < 1:
+                time.sleep(self.RESTART_DELAY)
+            self.spawn(worker_id)
+
+    def kill_remaining(self):
+        """ Kills the workers that did not exit in time.
+        """
+        for pid, worker_id in self.pids.items():
+            logger.warning('SUPERVISOR: Killing worker %s', worker_id)
+            with suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+
+    def run(self):
+        """ Starts the workers and supervises them until stopped.
+        """
+        logger.info('SUPERVISOR: Starting %s workers', self.workers)
+        self.listen()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for worker_id in range(self.workers):
+            self.spawn(worker_id)
+
+        killed = False
+        while self.pids:
+            self.reap()
+            if (self.stopping and not killed and time.monotonic()
+                    - self.stopped_at > self.shutdown_timeout):
+                self.kill_remaining()
+                killed = True
+            time.sleep(0.1)
+
+        if self.sock is not None:
+            self.sock.close()
+        logger.info('SUPERVISOR: Closed')
@@ -0,0 +1,97 @@
+"""
+Module: sync
+"""
+
+
+class StateSync:
+    """ A class to keep the sequence numbered state known by the clients
+    that synchronize through deltas.
+
+    Attributes
+    ----------
+    seq : int
+        Sequence number of the last delta
+    players : dict<str, dict>
+        Last json dict sent for every player, by player UID
+    """
+
+    FULL = 'full'
+    DELTA = 'delta'
+    MODES = [
+        FULL,
+        DELTA,
+    ]
+
+    def __init__(self):
+        self.seq = 0
+        self.players = dict()
+
+    def diff(self, players, complete=False):
+        """ Returns the field-level changes of the players since the last
+        call and stores their current state. Each change is a list
+        `[uid, field, value]`; a new player is sent as `[uid, None, json]`
+        and, when `complete` is True, players not present anymore are sent
+        as `[uid, None, None]`.
+        """
+        changes = []
+        uids = set()
+
+        for player in players:
+            uid = player.UID
+            uids.add(uid)
+            current = player.to_json()
+            previous = self.players.get(uid)
+            if previous is current:
+                continue
+
+            if previous is None:
+                changes.append([uid, None, current])
+            else:
+                for field, value in current.items():
+                    if previous.get(field) != value:
+                        changes.append([uid, field, value])
+            self.players[uid] = current
+
+        if complete and len(uids) != len(self.players):
+            for uid in list(self.players):
+                if uid not in uids:
+                    del self.players[uid]
+                    changes.append([uid, None, None])
+
+        return changes
+
+    def reset(self, players):
+        """ Stores the current state of the players without computing
+        changes. Used when no client follows the deltas.
+        """
+        self.players = {player.UID: player.to_json() for player in players}
+
+    def delta(self, changes):
+        """ Returns a delta message with the next sequence number.
+        """
+        self.seq += 1
+        response = {
+            'action': 'STATE_DELTA',
+            'seq': self.seq,
+            'changes': changes,
+        }
+        return response
+
+    def snapshot(self, game):
+        """ Returns a full snapshot of the state at the current sequence
+        number.
+        """
+        response = {
+            'action': 'STATE_SNAPSHOT',
+            'seq': self.seq,
+            'status': game.status,
+            'num_players': game.num_players,
+            'player_list': list(self.players.values()),
+            'player_turn': None,
+        }
+        if game.player_turn:
+            response['player_turn'] = game.player_turn.UID
+        if game.has_started():
+            response['board_version'] = game.board.definition.version
+            response['owners'] = game.board.owned()
+        return response
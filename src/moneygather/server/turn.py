@@ -1,7 +1,7 @@
 """
 Module: turn
 """
-import asyncio
+from moneygather.server.movement import STEP_DURATION
 
 
 class Turn:
@@ -11,26 +11,41 @@ class Turn:
     ----------
     game : Game
         Game reference
+    player : Player
+        Player that has the turn
+    status : int
+        Step of the turn
+    action_timeout : Timer
+        Timer of the current step, None if not any
+    action : int
+        Index of the current step in ACTIONS
+    movement_timeout : float
+        Seconds the movement of the turn takes
     """
 
+    __slots__ = (
+        'game',
+        'player',
+        'status',
+        'action_timeout',
+        'action',
+        'movement_timeout',
+    )
+
     ROLLING_DICES = 0
     MOVEMENT = 1
     BOX = 2
 
+    dices_timeout = 10
+    box_timeout = 1
+
     def __init__(self, game):
         self.game = game
         self.player = None
         self.status = self.ROLLING_DICES
         self.action_timeout = None
         self.action = -1
-        self.actions = [
-            self.rolling_dices_step,
-            self.movement_step,
-            self.box_step,
-        ]
-        self.dices_timeout = 10
         self.movement_timeout = 7
-        self.box_timeout = 1
 
     def turn_start(self, player):
         self.player = player
@@ -42,8 +57,8 @@ class Turn:
         """ Executes next action.
         """
         self.action += 1
-        next_action = self.actions[self.action]
-        next_action()
+        next_action = self.ACTIONS[self.action]
+        next_action(self)
 
     def rolling_dices_step(self):
         timeout = self.dices_timeout
@@ -62,9 +77,16 @@ class Turn:
         action = self.game.next_turn
         self.action_timeout = self.start_timeout_task(timeout, action)
 
+    # Steps of a turn, shared by all the turns
+    ACTIONS = (
+        rolling_dices_step,
+        movement_step,
+        box_step,
+    )
+
     def dices_end(self, dices):
         self.end_timeout_task()
-        self.movement_timeout = (dices[0] + dices[1]) * 0.5 + 1
+        self.movement_timeout = (dices[0] + dices[1]) * STEP_DURATION + 1
         self.next_action()
 
     def end_turn(self):
@@ -73,20 +95,16 @@ class Turn:
             self.player.client.send_player_end_dices()
 
     def start_timeout_task(self, timeout, action):
-        task = asyncio.ensure_future(
-            self.timeout_action(timeout, action))
-        return task
+        timer = self.game.scheduler.call_later(
+            timeout, self.timeout_action, action)
+        return timer
 
     def end_timeout_task(self):
         if self.action_timeout:
             self.action_timeout.cancel()
             self.action_timeout = None
 
-    async def timeout_action(self, timeout, action):
-        try:
-            await asyncio.sleep(timeout)
-            self.action_timeout = None
-            if action:
-                action()
-        except asyncio.CancelledError:
-            return
+    def timeout_action(self, action):
+        self.action_timeout = None
+        if action:
+            action()
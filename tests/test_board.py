@@ -0,0 +1,103 @@
+"""
+Module: test_board
+"""
+from moneygather.server.board import BoardDefinition
+from moneygather.server.board import DEFAULT_BOARD
+from moneygather.server.board import load_board
+from moneygather.server.board import read_layout
+from moneygather.server.boxes import PaymentBox
+from moneygather.server.boxes import TownBox
+from moneygather.server.exceptions import InvalidBoard
+
+import json
+import pytest
+
+
+def layout(**changes):
+    """ Returns a small valid layout, the box at position 1 updated with
+    `changes`.
+    """
+    boxes = [
+        {'position': 0, 'type': 'PaymentBox', 'name': 'Start', 'payment': 100},
+        {'position': 1, 'type': 'TownBox', 'name': 'Town', 'price': 200},
+        {'position': 2, 'type': 'Box', 'name': 'Jail'},
+    ]
+    boxes[1].update(changes)
+    return boxes
+
+
+def test_valid_board():
+    definition = BoardDefinition(layout())
+    assert len(definition) == 3
+    assert isinstance(definition.boxes[0], PaymentBox)
+    assert isinstance(definition.boxes[1], TownBox)
+    assert definition.layout['1'] == {
+        'name': 'Town',
+        'position': 1,
+        'price': 200,
+    }
+    assert definition.version == BoardDefinition(layout()).version
+
+
+def test_default_board():
+    assert load_board() is DEFAULT_BOARD
+    assert len(DEFAULT_BOARD)
+
+
+def test_board_file(tmp_path):
+    path = tmp_path / 'board.json'
+    path.write_text(json.dumps({'boxes': layout()}))
+    assert read_layout(str(path)) == layout()
+    assert load_board(str(path)).version == BoardDefinition(layout()).version
+
+
+@pytest.mark.parametrize('changes', [
+    {'price': 'lots'},
+    {'price': -1},
+    {'price': 1.5},
+    {'price': True},
+    {'name': 3},
+    {'type': 'Castle'},
+    {'position': True},
+    {'position': 0},
+    {'position': 3},
+    {'owner': 'nobody'},
+])
+def test_invalid_box(changes):
+    with pytest.raises(InvalidBoard):
+        BoardDefinition(layout(**changes))
+
+
+def test_missing_field():
+    boxes = layout()
+    del boxes[1]['price']
+    with pytest.raises(InvalidBoard):
+        BoardDefinition(boxes)
+
+
+@pytest.mark.parametrize('payment', ['lots', -100, False])
+def test_invalid_payment(payment):
+    boxes = layout()
+    boxes[0]['payment'] = payment
+    with pytest.raises(InvalidBoard):
+        BoardDefinition(boxes)
+
+
+def test_empty_board():
+    with pytest.raises(InvalidBoard):
+        BoardDefinition([])
+
+
+@pytest.mark.parametrize('content', ['{', '{"boxes": 3}', '[1, 2]'])
+def test_invalid_board_file(tmp_path, content):
+    path = tmp_path / 'board.json'
+    path.write_text(content)
+    with pytest.raises(InvalidBoard):
+        read_layout(str(path))
+
+
+def test_unknown_board_format(tmp_path):
+    path = tmp_path / 'board.yaml'
+    path.write_text('')
+    with pytest.raises(InvalidBoard):
+        read_layout(str(path))
@@ -0,0 +1,136 @@
+"""
+Module: test_game
+"""
+from moneygather.server.clock import VirtualClock
+from moneygather.server.game import Game
+from moneygather.server.player import Player
+from moneygather.server.room import DetachedClient
+from moneygather.server.scheduler import Scheduler
+from moneygather.server.simulation import HeadlessRoom
+
+import random
+
+
+def expected_next_turn(game, player_turn):
+    """ Returns the player following `player_turn` by scanning the turn
+    order, skipping the bankrupted players.
+    """
+    if player_turn is None:
+        return game.player_order[0]
+    index = game.player_order.index(player_turn)
+    while True:
+        index = (index + 1) % len(game.player_order)
+        player = game.player_order[index]
+        if not player.is_bankrupted():
+            return player
+
+
+def create_game(num_players, seed=0):
+    """ Returns a headless game and its room.
+    """
+    room = HeadlessRoom()
+    game = Game(
+        room,
+        num_players=num_players,
+        scheduler=Scheduler(VirtualClock()),
+        rng=random.Random(seed),
+    )
+    return game, room
+
+
+def seat_players(game):
+    """ Adds players to the game until it is full and returns them.
+    """
+    players = [
+        Player(DetachedClient(), game, random=False)
+        for _ in range(game.num_players - len(game.players))
+    ]
+    for player in players:
+        game.add_player(player)
+    return players
+
+
+def play_game(seed):
+    """ Plays a game with random bankruptcies, checking the turn, the
+    bankrupted count and the winner against scans of the players.
+    """
+    chaos = random.Random(seed)
+    game, room = create_game(chaos.randint(2, 8), seed)
+    players = seat_players(game)
+
+    players[0].set_ready()
+    players[0].set_not_ready()
+    for player in players[:-1]:
+        player.set_ready()
+    assert not game.has_started()
+    players[-1].set_ready()
+    assert game.has_started()
+    assert game.player_turn is game.player_order[0]
+
+    while not room.finished:
+        if chaos.random() < 0.3:
+            victim = chaos.choice(players)
+            if not victim.is_bankrupted():
+                player_turn = game.player_turn
+                expected = expected_next_turn(game, player_turn)
+                victim.add_money(-100000)
+                bankrupted = [p for p in players if p.is_bankrupted()]
+                assert game.num_players_bankrupt() == len(bankrupted)
+                assert game.has_finished() == (
+                    len(bankrupted) >= len(players) - 1
+                )
+                if room.finished:
+                    break
+                if victim is player_turn:
+                    assert game.player_turn is expected
+                    continue
+
+        expected = expected_next_turn(game, game.player_turn)
+        game.turn.end_turn()
+        game.next_turn()
+        assert game.player_turn is expected
+
+    game.turn.end_turn()
+    survivors = [p for p in players if not p.is_bankrupted()]
+    assert room.winner is survivors[0]
+
+
+def test_turn_order_matches_scan():
+    for seed in range(300):
+        play_game(seed)
+
+
+def finish_game(game):
+    """ Plays a game of two until its winner leaves, which resets the game.
+    Returns the bankrupted player, still a client of the room.
+    """
+    loser, winner = seat_players(game)
+    loser.set_ready()
+    winner.set_ready()
+    loser.add_money(-100000)
+    assert game.has_finished()
+    game.remove_player(winner)
+    assert not game.has_started()
+    assert not game.players
+    return loser
+
+
+def test_unseated_player_does_not_start_the_game():
+    game, _ = create_game(2)
+    leftover = finish_game(game)
+    first, second = seat_players(game)
+    leftover.set_ready()
+    first.set_ready()
+    assert not game.has_started()
+    second.set_ready()
+    assert game.has_started()
+
+
+def test_unseated_player_does_not_block_the_game():
+    game, _ = create_game(2)
+    leftover = finish_game(game)
+    first, second = seat_players(game)
+    leftover.set_not_ready()
+    first.set_ready()
+    second.set_ready()
+    assert game.has_started()